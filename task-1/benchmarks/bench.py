@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for Post-fix Calculator
+LVA 185.208 Programming Languages - Task 1
+
+Runs representative calculator workloads with warmup and repeats, stores
+the timings as a JSON baseline and compares two baselines:
+
+    python benchmarks/bench.py run [--out FILE] [--repeat N] [--warmup N] [--quick] [--only NAME ...]
+    python benchmarks/bench.py compare BASELINE [CURRENT] [--threshold 0.1]
+
+Without CURRENT, compare runs the workloads of BASELINE now.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import List
+
+# Add parent directory to path to import calculator
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from calculator import Calculator, CaptureOutput, PreReadInput
+
+# The conditional in these programs is 'cond (then)(else)3!4$_1+$@': it
+# runs `then` when cond is not 0 or empty.
+
+# Count letters, digits, spaces and all characters of the input line,
+# one character per iteration. Stack: letters digits spaces count text loop
+ANALYSIS_STEP = (
+    "2!0% "                                 # character code c
+    "1!64>2!91<&2!96>3!123<&| 8!+8$ "       # letters += c is a letter
+    "2!47>3!58<& 8!+8$ "                    # digits += c is a digit
+    "3!32= 8!+8$ "                          # spaces += c is a space
+    "7!1+8$ 5$ "                            # count += 1, drop c
+    "1 7!-7$ 6!7$ 1!@"                      # drop the first character, loop
+)
+ANALYSIS = "0 0 0 0 '(2!_(1$1$)(" + ANALYSIS_STEP + ")3!4$_1+$@)1!@"
+
+# Count the occurrences of (qz) in the input line with '/' and cutting
+# the text after each match. Stack: matches text loop
+SEARCH_STEP = "1+3!-3$ 3!1+4$ 3!4$ 3!4$ 2!3$ 1!@"
+SEARCH = "0 '(2!(qz)/ 1!0< (1$1$1$)(" + SEARCH_STEP + ")3!4$_1+$@)1!@"
+
+# Read a line, run it and print the top of the stack until an empty line.
+# The loop string stays at the bottom of the stack, where '#!' finds it.
+# (Register 'a' is not used: its welcome text is not valid calculator code.)
+REPL = "('1!()=(1$)(#!\\@ 1!\"(\n)\")3!4$_1+$@)1!@"
+
+# Count n down to 0, each iteration deferred with '\'. Stack: n loop
+COUNTDOWN = "(2!1-3$2!3$2!(1!\\)()3!4$_1+$@)1!\\"
+
+
+def _text(size: int, alphabet: str, seed: int) -> str:
+    """Reproducible input line of size characters starting with a letter"""
+    rng = random.Random(seed)
+    return 'a' + ''.join(rng.choice(alphabet) for _ in range(size - 1))
+
+def arithmetic_chain(size: int) -> tuple:
+    """A long straight-line chain of literal arithmetic"""
+    return "0 " + "1+ 2* 3- 7% 5 4*+ 1.5* 2.5- ?" * size, []
+
+def repl(size: int) -> tuple:
+    """The read-eval-print loop fed size scripted lines"""
+    lines = [f"{i} {i + 1}+ 3* 2!2!< 1$" if i % 2 else f"(x{i}) 1!+ 1$ #" for i in range(size)]
+    return REPL, lines + [""]
+
+def string_analysis(size: int) -> tuple:
+    """Character classes of a size character line, one character at a time"""
+    return ANALYSIS, [_text(size, "abcdefXYZ0123456789 +-/[]$!", 1)]
+
+def string_search(size: int) -> tuple:
+    """Matches of a word in a size character line, found with '/'"""
+    text = _text(65536, "abcdefgh ", 2) * (size // 65536 + 1)
+    step = size // 16
+    return SEARCH, [''.join(text[i:i + step] + "qz" for i in range(0, size, step))]
+
+def deep_stack(size: int) -> tuple:
+    """Rotate a stack of size entries size times with '!' and '$'"""
+    return ' '.join(map(str, range(size))) + f" {size}!{size + 1}$" * size, []
+
+def countdown(size: int) -> tuple:
+    """A loop of size iterations driven by '\\'"""
+    return f"{size}" + COUNTDOWN, []
+
+# name: (builder, size, large); large workloads are skipped with --quick
+WORKLOADS = {
+    'arithmetic_chain': (arithmetic_chain, 20000, False),
+    'repl': (repl, 2000, False),
+    'string_analysis_1k': (string_analysis, 1000, False),
+    'string_analysis_10k': (string_analysis, 10000, False),
+    'string_analysis_100k': (string_analysis, 100000, True),
+    'string_search_1m': (string_search, 10 ** 6, False),
+    'string_search_10m': (string_search, 10 ** 7, True),
+    'deep_stack': (deep_stack, 5000, False),
+    'countdown': (countdown, 20000, False),
+}
+
+
+def run_workload(name: str, repeat: int = 5, warmup: int = 1, size: int = None) -> dict:
+    """Timing statistics in seconds of repeat runs of a workload after warmup runs"""
+    builder, default_size, _ = WORKLOADS[name]
+    program, lines = builder(default_size if size is None else size)
+    times = []
+    for index in range(warmup + repeat):
+        calc = Calculator(output=CaptureOutput(), input=PreReadInput(lines))
+        calc.command_stream = program
+        start = time.perf_counter()
+        calc.run()
+        elapsed = time.perf_counter() - start
+        if index >= warmup:
+            times.append(elapsed)
+    return {
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'steps': calc.steps,
+        # What the program computed: a faster run that computes something else is no win
+        'result': repr(calc.data_stack[-5:])[:200],
+    }
+
+def run_benchmarks(names: List[str] = None, repeat: int = 5, warmup: int = 1, quick: bool = False,
+                   log=None) -> dict:
+    """Baseline of the named workloads (all but the large ones with quick)"""
+    if names is None:
+        names = [name for name, (_, _, large) in WORKLOADS.items() if not (quick and large)]
+    results = {}
+    for name in names:
+        results[name] = run_workload(name, repeat, warmup)
+        if log is not None:
+            stats = results[name]
+            log.write(f"{name:<24}{stats['median'] * 1e3:>12.3f} ms"
+                      f"  ±{stats['stdev'] * 1e3:.3f}  ({stats['steps']} steps)\n")
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'warmup': warmup,
+        'workloads': results,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> List[dict]:
+    """Median time ratio current/baseline for each workload in either
+    
+    The status is 'changed' when the workload computed something else,
+    'regression' when the ratio exceeds 1 + threshold, 'improvement' below
+    1 / (1 + threshold) and 'ok' otherwise; 'missing' and 'new' mark
+    workloads in only one of them.
+    """
+    rows = []
+    before, after = baseline['workloads'], current['workloads']
+    for name in list(before) + [name for name in after if name not in before]:
+        if name not in after or name not in before:
+            rows.append({'name': name, 'status': 'missing' if name not in after else 'new'})
+            continue
+        ratio = after[name]['median'] / before[name]['median']
+        if after[name]['result'] != before[name]['result']:
+            status = 'changed'
+        elif ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline': before[name]['median'], 'current': after[name]['median'],
+                     'ratio': ratio, 'status': status})
+    return rows
+
+def format_comparison(rows: List[dict]) -> str:
+    lines = [f"{'Workload':<24}{'Baseline ms':>14}{'Current ms':>14}{'Ratio':>9}  Status"]
+    for row in rows:
+        if 'ratio' in row:
+            lines.append(f"{row['name']:<24}{row['baseline'] * 1e3:>14.3f}{row['current'] * 1e3:>14.3f}"
+                         f"{row['ratio']:>9.3f}  {row['status']}")
+        else:
+            lines.append(f"{row['name']:<24}{'':>37}  {row['status']}")
+    return '\n'.join(lines)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calculator benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the workloads and write a JSON baseline")
+    run.add_argument('--out', help="baseline file (default: stdout)")
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--warmup', type=int, default=1)
+    run.add_argument('--quick', action='store_true', help="skip the large workloads")
+    run.add_argument('--only', nargs='+', choices=list(WORKLOADS), metavar='NAME')
+    check = commands.add_parser('compare', help="flag workloads slower than a baseline")
+    check.add_argument('baseline')
+    check.add_argument('current', nargs='?', help="second baseline (default: run now)")
+    check.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown (default: 0.1)")
+    check.add_argument('--repeat', type=int, default=5)
+    check.add_argument('--warmup', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run_benchmarks(args.only, args.repeat, args.warmup, args.quick, log=sys.stderr)
+        if args.out:
+            with open(args.out, 'w') as file:
+                json.dump(results, file, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if args.current:
+        with open(args.current) as file:
+            current = json.load(file)
+    else:
+        current = run_benchmarks([name for name in baseline['workloads'] if name in WORKLOADS],
+                                 args.repeat, args.warmup, log=sys.stderr)
+    rows = compare(baseline, current, args.threshold)
+    print(format_comparison(rows))
+    return 1 if any(row['status'] in ('regression', 'changed') for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,534 @@ Post-fix Stack-based Calculator - Assignment Compliant Version
 LVA 185.208 Programming Languages - Task 1
 """
 
+import json
+import math
+import os
+import re
 import sys
+import threading
+import time
+from collections import deque, OrderedDict
 from typing import Union, List, Dict, Any
 
 Value = Union[int, float, str]
 EPSILON = 1e-10
+TEXT_THRESHOLD = 64  # strings this long are built and trimmed as Text
+CHECK_INTERVAL = 256  # steps between checks of the stack depth and time limits
 
-class Calculator:
+class CommandStream:
+    """Remaining commands as a cursor over a deque of string segments
+    
+    Advancing moves a cursor, '@' puts a segment in front and '\\' appends
+    one, all in constant time; the text itself is never copied.
+    """
+    __slots__ = ('text', 'pos', 'segments')
+    
+    def __init__(self, text: str = ""):
+        self.reset(text)
+    
+    def reset(self, text: str):
+        self.text = text        # current segment
+        self.pos = 0            # cursor into it; only the empty stream sits at the end
+        self.segments = deque() # (text, pos) segments that follow, none of them exhausted
+    
+    def __bool__(self) -> bool:
+        return self.pos < len(self.text)
+    
+    def __str__(self) -> str:
+        return self.text[self.pos:] + ''.join(text[pos:] for text, pos in self.segments)
+    
+    def next(self) -> str:
+        """Remove and return the first command character"""
+        char = self.text[self.pos]
+        self.pos += 1
+        if self.pos == len(self.text):
+            self.text, self.pos = self.segments.popleft() if self.segments else ("", 0)
+        return char
+    
+    def advance_to(self, pos: int):
+        """Move the cursor to pos within the current segment"""
+        if pos < len(self.text):
+            self.pos = pos
+        else:
+            self.text, self.pos = self.segments.popleft() if self.segments else ("", 0)
+    
+    def push_front(self, text: str):
+        """Insert text before the remaining commands"""
+        if text:
+            if self.pos < len(self.text):
+                self.segments.appendleft((self.text, self.pos))
+            self.text, self.pos = text, 0
+    
+    def append(self, text: str):
+        """Append text after the remaining commands"""
+        if text:
+            if self.pos < len(self.text):
+                self.segments.append((text, 0))
+            else:
+                self.text, self.pos = text, 0
+
+class Text:
+    """Long calculator string kept as a view into shared character buffers
+    
+    Characters live in two lists, `front` holding the beginning in reverse
+    order and `back` holding the rest, and a Text sees front[fstart:fend]
+    and back[bstart:bend]. Like str it never changes: appending, prepending
+    and trimming return new views, and a buffer is only extended in place
+    when no other view has grown it already, so copies made with '!' are
+    unaffected. Indexing is constant time. Programs never see a Text: it
+    becomes a str for output, comparison, '@' and at the end of a run.
+    """
+    __slots__ = ('front', 'fstart', 'fend', 'back', 'bstart', 'bend', '_str')
+    
+    def __init__(self, front: list, fstart: int, fend: int, back: list, bstart: int, bend: int):
+        self.front, self.fstart, self.fend = front, fstart, fend
+        self.back, self.bstart, self.bend = back, bstart, bend
+        self._str = None
+    
+    @classmethod
+    def of(cls, text) -> 'Text':
+        if isinstance(text, Text):
+            return text
+        return cls([], 0, 0, list(text), 0, len(text))
+    
+    def __len__(self) -> int:
+        return self.fend - self.fstart + self.bend - self.bstart
+    
+    def __str__(self) -> str:
+        if self._str is None:
+            self._str = ''.join(reversed(self.front[self.fstart:self.fend])) + \
+                        ''.join(self.back[self.bstart:self.bend])
+        return self._str
+    
+    def __repr__(self) -> str:
+        return f"Text({str(self)!r})"
+    
+    def __getitem__(self, index: int) -> str:
+        # 0 <= index < len(self)
+        count = self.fend - self.fstart
+        if index < count:
+            return self.front[self.fend - 1 - index]
+        return self.back[self.bstart + index - count]
+    
+    def append(self, text: str) -> 'Text':
+        back, bstart = self.back, self.bstart
+        if len(back) != self.bend:
+            back, bstart = back[bstart:self.bend], 0
+        back.extend(text)
+        return Text(self.front, self.fstart, self.fend, back, bstart, len(back))
+    
+    def prepend(self, text: str) -> 'Text':
+        front, fstart = self.front, self.fstart
+        if len(front) != self.fend:
+            front, fstart = front[fstart:self.fend], 0
+        front.extend(reversed(text))
+        return Text(front, fstart, len(front), self.back, self.bstart, self.bend)
+    
+    def drop_last(self, count: int) -> 'Text':
+        """Text without its last count characters, count < len(self)"""
+        if count <= self.bend - self.bstart:
+            return Text(self.front, self.fstart, self.fend, self.back, self.bstart, self.bend - count)
+        count -= self.bend - self.bstart
+        return Text(self.front, self.fstart + count, self.fend, self.back, self.bstart, self.bstart)
+    
+    def drop_first(self, count: int) -> 'Text':
+        """Text without its first count characters, count < len(self)"""
+        if count <= self.fend - self.fstart:
+            return Text(self.front, self.fstart, self.fend - count, self.back, self.bstart, self.bend)
+        count -= self.fend - self.fstart
+        return Text(self.front, self.fstart, self.fstart, self.back, self.bstart + count, self.bend)
+
+class FragmentCache:
+    """LRU of decoded fragments keyed by (text, start position)
+    
+    A fragment is (ops, starts): the decoded ops and a map from each op
+    boundary to the index of the op that follows, so execution resuming
+    inside a string (after '@' returns) reuses the fragment decoded from
+    its beginning.
+    
+    Generating a function costs about as much as interpreting a fragment
+    ten times, so a fragment is only compiled once it has been applied
+    `threshold` times; until then it is interpreted.
+    
+    One cache is shared by every calculator in the process, and
+    calculators may run on different threads: all methods take the
+    cache's lock, and what it holds (decoded ops, generated functions)
+    depends on the fragment text alone. The application counts that
+    decide when a fragment is hot belong to each caller and are passed
+    to function(), so one calculator's load never decides when another
+    compiles its code. A single Calculator is not thread-safe.
+    """
+    
+    def __init__(self, size: int = 256, threshold: int = 16):
+        self.size = size
+        self.threshold = threshold
+        self.entries: OrderedDict = OrderedDict()
+        self.functions: OrderedDict = OrderedDict()  # text -> compiled function or None
+        self.lock = threading.Lock()
+    
+    def get(self, text: str, pos: int = 0):
+        """Ops for text and the index of the op at pos"""
+        with self.lock:
+            ops, starts = self._fragment(text, 0)
+            index = starts.get(pos)
+            if index is None:
+                # pos is not a boundary of the full decode (reached after a
+                # literal carried over from another segment): decode from pos
+                ops, starts = self._fragment(text, pos)
+                index = 0
+        return ops, index
+    
+    def fragment(self, text: str, pos: int):
+        with self.lock:
+            return self._fragment(text, pos)
+    
+    def _fragment(self, text: str, pos: int):
+        key = (text, pos)
+        fragment = self.entries.get(key)
+        if fragment is None:
+            ops = decode(text, pos)
+            starts = {pos: 0}
+            for index, op in enumerate(ops, 1):
+                starts[op[2]] = index
+            fragment = self.entries[key] = (ops, starts)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return fragment
+    
+    def function(self, text: str, counts: OrderedDict):
+        """Generated function for an application of text
+        
+        counts maps texts to the caller's applications of them (an LRU of
+        at most size entries, updated here). None if text is not
+        straight-line or not yet applied threshold times.
+        """
+        count = counts.pop(text, 0)
+        if count < self.threshold:
+            count += 1
+        counts[text] = count
+        if len(counts) > self.size:
+            counts.popitem(last=False)
+        if count < self.threshold:
+            return None
+        return self.compile(text)
+    
+    def compile(self, text: str):
+        """Generated function for text, or None if it is not straight-line"""
+        with self.lock:
+            if text in self.functions:
+                self.functions.move_to_end(text)
+                return self.functions[text]
+            function = FragmentCompiler().compile(self._fragment(text, 0)[0])
+            self.functions[text] = function
+            if len(self.functions) > self.size:
+                self.functions.popitem(last=False)
+        return function
+
+class FragmentMemo:
+    """LRU of results of pure fragments applied with '@'
+    
+    A pure fragment is a generated function that reads no registers and
+    not the stack size and does no I/O (see FragmentCompiler), so its
+    results depend only on the entries it takes from the top of the
+    stack. They are kept under (fragment, entries taken) and replace
+    those entries on a hit.
+    """
+    
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def run(self, function, text: str, calc) -> bool:
+        """Apply function as '@' would, from the memo if possible"""
+        stack = calc.data_stack
+        start = len(stack) - function.entries
+        if start < 0:
+            return False
+        # 1 and 1.0 (or 0.0 and -0.0) compare equal but do not behave alike
+        key = (text, tuple((value.__class__, repr(value) if value.__class__ is float else str(value))
+                           for value in stack[start:]))
+        results = self.entries.get(key)
+        if results is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            stack[start:] = results
+            return True
+        self.misses += 1
+        if not function(calc, stack, calc.registers):
+            return False
+        self.entries[key] = tuple(stack[start:])
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return True
+
+class Profiler:
+    """Opcode-level profile of the decoded engine
+    
+    Collects, per op dispatched: counts and cumulative time by opcode, time
+    by the operation mode the op started in, applications and self time of
+    each fragment run with '@' or '\\' (by source string), the peak stack
+    depth, and self time per call path for flame graphs. Superinstructions
+    are named by their source, literals as 'number', 'string' or 'literal'.
+    
+    Fragments applied with '@' are interpreted, not run as generated
+    functions, so that their ops show up in the profile.
+    """
+    
+    MODES = ('execution', 'integer', 'decimal', 'string')
+    
     def __init__(self):
-        self.command_stream = ""
+        self.ops: Dict[str, list] = {}        # opcode -> [count, seconds]
+        self.modes: Dict[str, float] = {}     # operation mode -> seconds
+        self.fragments: Dict[str, list] = {}  # segment text -> [applications, seconds]
+        self.folded: Dict[str, float] = {}    # 'frame;...;opcode' -> seconds
+        self.peak_depth = 0
+        self._frames = []  # (text, segment to return to, path) of the '@' calls in progress
+        self._labels: Dict[str, str] = {}
+    
+    def label(self, text: str, width: int = 40) -> str:
+        """Fragment text as a one-line flame graph frame"""
+        label = self._labels.get(text)
+        if label is None:
+            label = ' '.join(text.split()).replace(';', ',')
+            if len(label) > width:
+                label = label[:width - 3] + '...'
+            if len(self._labels) < 4096:
+                self._labels[text] = label
+        return label
+    
+    @staticmethod
+    def mode_name(mode: int) -> str:
+        return Profiler.MODES[0 if mode == 0 else 1 if mode == -1 else 2 if mode < -1 else 3]
+    
+    def start(self, stream: CommandStream):
+        """Begin a run at the current segment of stream"""
+        self._frames = [(stream.text, None, self.label(stream.text))]
+    
+    def _unwind(self, front):
+        """Drop the calls whose caller is no longer waiting at the front of the stream"""
+        frames = self._frames
+        while len(frames) > 1 and frames[-1][1] is not front:
+            frames.pop()
+    
+    def sync(self, stream: CommandStream):
+        """Follow the stream back to callers and on to appended segments"""
+        self._unwind(stream.segments[0] if stream.segments else None)
+        frames = self._frames
+        if len(frames) == 1 and frames[0][0] is not stream.text:
+            # A segment appended with '\' runs at the top level
+            frames[0] = (stream.text, None, self.label(stream.text))
+    
+    def applied(self, text: str):
+        """Count an application of text with '@' or '\\'"""
+        if text:
+            entry = self.fragments.get(text)
+            if entry is None:
+                entry = self.fragments[text] = [0, 0.0]
+            entry[0] += 1
+    
+    def push_front(self, text: str, stream: CommandStream):
+        """Apply text with '@' as a call from the running fragment"""
+        self.applied(text)
+        if not text:
+            return
+        caller = bool(stream)
+        stream.push_front(text)
+        segments = stream.segments
+        if caller:
+            self._unwind(segments[1] if len(segments) > 1 else None)
+            frames = self._frames
+            frames.append((text, segments[0], frames[-1][2] + ';' + self.label(text)))
+        else:
+            # Nothing is left after it: text is the whole program now
+            self._frames = [(text, None, self.label(text))]
+    
+    def path(self) -> str:
+        """Call path of the op about to run"""
+        return self._frames[-1][2]
+    
+    def record(self, name: str, mode: int, text: str, path: str, seconds: float, depth: int):
+        """Account one op that started in mode in segment text on call path"""
+        entry = self.ops.get(name)
+        if entry is None:
+            entry = self.ops[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        mode = self.mode_name(mode)
+        self.modes[mode] = self.modes.get(mode, 0.0) + seconds
+        entry = self.fragments.get(text)
+        if entry is None:
+            entry = self.fragments[text] = [0, 0.0]
+        entry[1] += seconds
+        path += ';' + name.replace(';', ',')
+        self.folded[path] = self.folded.get(path, 0.0) + seconds
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+    
+    def report(self, limit: int = 10) -> str:
+        """Tables of the opcodes, modes and hottest fragments by time"""
+        lines = [f"{'Opcode':<24}{'Count':>12}{'Time ms':>12}{'Per op us':>12}"]
+        for name, (count, seconds) in sorted(self.ops.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{self.label(name, 24):<24}{count:>12}{seconds * 1e3:>12.3f}"
+                         f"{seconds * 1e6 / count:>12.3f}")
+        lines += ["", f"{'Mode':<24}{'Time ms':>12}"]
+        for mode in self.MODES:
+            if mode in self.modes:
+                lines.append(f"{mode:<24}{self.modes[mode] * 1e3:>12.3f}")
+        lines += ["", f"{'Fragment':<44}{'Applied':>12}{'Time ms':>12}"]
+        hottest = sorted(self.fragments.items(), key=lambda item: -item[1][1])[:limit]
+        for text, (applications, seconds) in hottest:
+            lines.append(f"{self.label(text):<44}{applications:>12}{seconds * 1e3:>12.3f}")
+        lines += ["", f"Peak stack depth: {self.peak_depth}"]
+        return '\n'.join(lines)
+    
+    def write_folded(self, file):
+        """Write 'frame;...;opcode microseconds' lines, as flamegraph.pl reads them"""
+        for path, seconds in sorted(self.folded.items()):
+            file.write(f"{path} {max(1, round(seconds * 1e6))}\n")
+
+class ConsoleOutput:
+    """Writes straight to sys.stdout, as looked up at each write"""
+    
+    def write(self, text: str):
+        sys.stdout.write(text)
+    
+    def flush(self):
+        sys.stdout.flush()
+
+class BufferedOutput:
+    """Collects output and writes it to a text stream in chunks of about size characters"""
+    
+    def __init__(self, stream=None, size: int = 8192):
+        self.stream = stream  # None: sys.stdout at flush time
+        self.size = size
+        self.parts: List[str] = []
+        self.pending = 0
+    
+    def write(self, text: str):
+        self.parts.append(text)
+        self.pending += len(text)
+        if self.pending >= self.size:
+            self.flush()
+    
+    def flush(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        if self.parts:
+            stream.write(''.join(self.parts))
+            self.parts.clear()
+            self.pending = 0
+        stream.flush()
+
+class CaptureOutput:
+    """Keeps all output in memory"""
+    
+    def __init__(self):
+        self.parts: List[str] = []
+    
+    def write(self, text: str):
+        self.parts.append(text)
+    
+    def flush(self):
+        pass
+    
+    def getvalue(self) -> str:
+        """Everything written so far"""
+        if len(self.parts) > 1:
+            self.parts[:] = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ""
+    
+    def getbytes(self, encoding: str = 'utf-8') -> bytes:
+        return self.getvalue().encode(encoding)
+    
+    def clear(self):
+        self.parts.clear()
+
+class ConsoleInput:
+    """Reads lines from stdin with input()"""
+    
+    def readline(self) -> str:
+        """Next line without its newline; EOFError at end of input"""
+        return input()
+
+class PreReadInput:
+    """Serves lines from text, a list of lines or a file read up front"""
+    
+    def __init__(self, source):
+        if hasattr(source, 'read'):
+            source = source.read()
+        if isinstance(source, str):
+            source = source.splitlines()
+        self.lines = deque(source)
+    
+    def readline(self) -> str:
+        if not self.lines:
+            raise EOFError
+        return self.lines.popleft()
+
+class LimitExceeded(Exception):
+    """A limit set on a Calculator was exceeded
+    
+    Carries the state execution stopped in: the data stack, the remaining
+    command stream, the operation mode and the steps run so far.
+    """
+    
+    def __init__(self, message: str, limit, calc: 'Calculator'):
+        super().__init__(message)
+        self.limit = limit
+        self.data_stack = [str(value) if value.__class__ is Text else value for value in calc.data_stack]
+        self.command_stream = calc.command_stream
+        self.operation_mode = calc.operation_mode
+        self.steps = None  # filled in by execute()
+
+class StepLimitExceeded(LimitExceeded):
+    """More than max_steps commands were about to run"""
+
+class StackLimitExceeded(LimitExceeded):
+    """The data stack grew deeper than max_stack_depth"""
+
+class StringLimitExceeded(LimitExceeded):
+    """A string longer than max_string_length was about to be built"""
+
+class DeadlineExceeded(LimitExceeded):
+    """The run took longer than time_limit seconds"""
+
+class Calculator:
+    ENGINES = ('decoded', 'reference')
+    fragments = FragmentCache()  # shared by all calculators and threads; decoding is pure
+    
+    def __init__(self, engine: str = 'decoded', output=None, input=None, memo_size: int = 0,
+                 max_steps: int = None, max_stack_depth: int = None, max_string_length: int = None,
+                 time_limit: float = None, profile: bool = False):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if profile and engine != 'decoded':
+            raise ValueError("Profiling needs the decoded engine")
+        self.engine = engine  # 'decoded': cached opcode fragments, 'reference': one character at a time
+        self.output = output if output is not None else ConsoleOutput()  # '"' and error messages
+        self.input = input if input is not None else ConsoleInput()      # "'"
+        self.memo = FragmentMemo(memo_size) if memo_size else None      # pure '@' results; decoded engine only
+        self._applications: OrderedDict = OrderedDict()  # fragment text -> times applied with '@'
+        self.profiler = Profiler() if profile else None                 # accumulates over runs
+        # Limits for each execute(), None for no limit. Steps and string
+        # lengths are exact; the time is checked every CHECK_INTERVAL steps
+        # and the stack depth as often as it could have reached the limit
+        # pushing one entry per step.
+        self.max_steps = max_steps
+        self.max_stack_depth = max_stack_depth
+        self.max_string_length = max_string_length
+        self.time_limit = time_limit
+        self._deadline = None
+        self._stream = CommandStream()
         self.operation_mode = 0  # 0: execution, -1: int construction, <-1: decimal places, >0: string construction
         self.data_stack: List[Value] = []
         self.registers: Dict[str, Value] = {}
+        self._literal = None  # (source text, value) of the decimal under construction
+        self.steps = 0  # commands dispatched by run(); literals count once in the decoded engine
+        self.errors: List[str] = []  # messages passed to error()
         
         # Initialize registers with default values
         self._init_registers()
@@ -24,6 +540,30 @@ class Calculator:
         if 'a' in self.registers and isinstance(self.registers['a'], str):
             self.command_stream = self.registers['a']
     
+    def reset(self):
+        """Return to the freshly constructed state with an empty command stream
+        
+        Keeps the engine, the channels and the warm fragment cache, so one
+        calculator can run many programs.
+        """
+        self._stream.reset("")
+        self.operation_mode = 0
+        self.data_stack.clear()
+        self.registers.clear()
+        self._init_registers()
+        self._literal = None
+        self.steps = 0
+        self.errors.clear()
+    
+    @property
+    def command_stream(self) -> str:
+        """Remaining commands as a string (built on demand)"""
+        return str(self._stream)
+    
+    @command_stream.setter
+    def command_stream(self, text: str):
+        self._stream.reset(text)
+    
     def _init_registers(self):
         """Initialize registers with predefined values according to assignment"""
         # Register 'a' must contain startup program with welcome and interactive loop
@@ -82,8 +622,9 @@ class Calculator:
     
     def error(self, message: str):
         """Handle calculator errors"""
-        print(f"Error: {message}")
-        self.command_stream = ""  # Stop execution
+        self.errors.append(message)
+        self.output.write(f"Error: {message}\n")
+        self._stream.reset("")  # Stop execution
     
     def push(self, value: Value):
         """Push a value onto the data stack"""
@@ -108,7 +649,7 @@ class Calculator:
     
     def is_string(self, value: Value) -> bool:
         """Check if value is a string"""
-        return isinstance(value, str)
+        return isinstance(value, (str, Text))
     
     def to_bool(self, value: Value) -> bool:
         """Convert value to boolean (0 and empty string are false)"""
@@ -118,10 +659,17 @@ class Calculator:
             return abs(value) > EPSILON
         elif isinstance(value, str):
             return value != ""
+        elif isinstance(value, Text):
+            return len(value) != 0
         return False
     
     def compare_values(self, a: Value, b: Value, op: str) -> int:
         """Compare two values according to assignment specification"""
+        if isinstance(a, Text):
+            a = str(a)
+        if isinstance(b, Text):
+            b = str(b)
+        
         # String vs number: number is always smaller than string
         if self.is_string(a) and self.is_number(b):
             return 0 if op == '=' else (0 if op == '>' else 1)
@@ -174,6 +722,15 @@ class Calculator:
         # Pop in correct order: second operand first, then first operand
         second = self.pop()  # This was pushed second (right operand)
         first = self.pop()   # This was pushed first (left operand)
+        self.push(self.arithmetic(first, second, op))
+    
+    def arithmetic(self, first: Value, second: Value, op: str) -> Value:
+        """Result of first op second"""
+        if first.__class__ is int and second.__class__ is int and op in '+-*':
+            # Integer fast path: none of the string cases below apply
+            if op == '+':
+                return first + second
+            return first - second if op == '-' else first * second
         
         # String operations
         if op == '+':
@@ -181,53 +738,49 @@ class Calculator:
             if self.is_string(first) or self.is_string(second):
                 str_first = str(first) if not self.is_string(first) else first
                 str_second = str(second) if not self.is_string(second) else second
-                self.push(str_first + str_second)
-                return
+                return self.concat(str_first, str_second)
         
         elif op == '*':
             # String * integer: extend string with ASCII character
             if self.is_string(first) and isinstance(second, int) and 0 <= second <= 128:
                 # First arg is string, second is int: add char to end
-                self.push(first + chr(second))
-                return
+                return self.concat(first, chr(second))
             elif isinstance(first, int) and self.is_string(second) and 0 <= first <= 128:
                 # First arg is int, second is string: add char to beginning  
-                self.push(chr(first) + second)
-                return
+                return self.concat(chr(first), second)
         
         elif op == '-':
             # String - integer: remove characters
             if self.is_string(first) and isinstance(second, int) and second > 0:
                 # Remove from end
-                result = first[:-second] if second < len(first) else ""
-                self.push(result)
-                return
+                if second >= len(first):
+                    return ""
+                if isinstance(first, str) and len(first) < TEXT_THRESHOLD:
+                    return first[:-second]
+                return Text.of(first).drop_last(second)
             elif isinstance(first, int) and self.is_string(second) and first > 0:
                 # Remove from beginning
-                result = second[first:] if first < len(second) else ""
-                self.push(result)
-                return
+                if first >= len(second):
+                    return ""
+                if isinstance(second, str) and len(second) < TEXT_THRESHOLD:
+                    return second[first:]
+                return Text.of(second).drop_first(first)
         
         elif op == '/':
             # String / string: find position of second in first
             if self.is_string(first) and self.is_string(second):
-                pos = first.find(second)
-                self.push(pos)
-                return
+                return str(first).find(str(second))
         
         elif op == '%':
             # String % integer: get ASCII code at position
             if self.is_string(first) and isinstance(second, int):
                 if 0 <= second < len(first):
-                    self.push(ord(first[second]))
-                else:
-                    self.push("")
-                return
+                    return ord(first[second])
+                return ""
         
         # Numeric operations
         if not (self.is_number(first) and self.is_number(second)):
-            self.push("")  # Empty string for invalid operations
-            return
+            return ""  # Empty string for invalid operations
         
         # Type promotion for mixed int/float
         if isinstance(first, int) and isinstance(second, float):
@@ -237,8 +790,7 @@ class Calculator:
         
         # Division by zero check
         if op in ['/', '%'] and abs(second) < EPSILON:
-            self.push("")
-            return
+            return ""
         
         # Execute operation: first op second
         try:
@@ -252,16 +804,37 @@ class Calculator:
                 result = first / second
             elif op == '%':
                 if isinstance(first, float) or isinstance(second, float):
-                    self.push("")  # Modulo undefined for floats
-                    return
+                    return ""  # Modulo undefined for floats
                 result = first % second
             else:
-                self.push("")
-                return
+                return ""
             
-            self.push(result)
+            return result
         except:
-            self.push("")
+            return ""
+    
+    def _string_limit(self) -> StringLimitExceeded:
+        return StringLimitExceeded(f"String longer than {self.max_string_length} characters",
+                                   self.max_string_length, self)
+    
+    def concat(self, first, second):
+        """first + second for strings, as a Text once the result is long"""
+        if self.max_string_length is not None and len(first) + len(second) > self.max_string_length:
+            raise self._string_limit()
+        if isinstance(first, Text):
+            return first.append(str(second))
+        if isinstance(second, Text):
+            return second.prepend(first)
+        if len(first) + len(second) >= TEXT_THRESHOLD:
+            return Text.of(first).append(second)
+        return first + second
+    
+    def _extend_string(self, top: str, char: str):
+        # String construction: top, popped, one character longer
+        if self.max_string_length is not None and len(top) >= self.max_string_length:
+            self.push(top)
+            raise self._string_limit()
+        self.push(top + char)
     
     def execute_command(self, char: str):
         """Execute a single command character according to assignment"""
@@ -286,7 +859,8 @@ class Calculator:
                 if not isinstance(top, int):
                     self.error("Top of stack must be integer for decimal conversion")
                     return
-                self.push(float(top))
+                float(top)  # OverflowError for integers beyond float range
+                self._push_decimal(f"{top}.")
                 self.operation_mode = -2
                 return
             else:
@@ -304,14 +878,19 @@ class Calculator:
                 if not isinstance(top, float):
                     self.error("Top of stack must be float in decimal construction mode")
                     return
-                # Add digit * 10^(m+1) where m is current mode
-                multiplier = 10.0 ** (self.operation_mode + 1)
-                self.push(top + float(char) * multiplier)
+                digit = float(char)
+                if self._literal is not None and self._literal[1] is top:
+                    # Parse the digits read so far, exact to the last place
+                    self._push_decimal(self._literal[0] + char)
+                else:
+                    # Add digit * 10^(m+1) where m is current mode
+                    multiplier = 10.0 ** (self.operation_mode + 1)
+                    self.push(top + digit * multiplier)
                 self.operation_mode -= 1
                 return
             elif char == '.':
                 # Start new floating point number
-                self.push(0.0)
+                self._push_decimal("0.")
                 self.operation_mode = -2
                 return
             else:
@@ -329,7 +908,7 @@ class Calculator:
                 if not isinstance(top, str):
                     self.error("Top of stack must be string in string construction mode")
                     return
-                self.push(top + char)
+                self._extend_string(top, char)
                 self.operation_mode += 1
                 return
             elif char == ')':
@@ -342,7 +921,7 @@ class Calculator:
                     return
                 if self.operation_mode > 1:
                     # Add closing paren to string
-                    self.push(top + char)
+                    self._extend_string(top, char)
                 else:
                     # Don't add the final closing paren
                     self.push(top)
@@ -357,7 +936,7 @@ class Calculator:
                 if not isinstance(top, str):
                     self.error("Top of stack must be string in string construction mode")
                     return
-                self.push(top + char)
+                self._extend_string(top, char)
                 return
         
         # Execution mode (0)
@@ -365,159 +944,525 @@ class Calculator:
             self.push(int(char))
             self.operation_mode = -1
         elif char == '.':
-            self.push(0.0)
+            self._push_decimal("0.")
             self.operation_mode = -2
         elif char == '(':
             self.push("")
             self.operation_mode = 1
-        elif char in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz':
-            # Push register content
-            self.push(self.registers.get(char, ""))
-        elif char in '=<>':
-            if len(self.data_stack) < 2:
-                self.error("Not enough operands for comparison")
-                return
-            second = self.pop()
-            first = self.pop()
-            result = self.compare_values(first, second, char)
-            self.push(result)
-        elif char in '+-*/%':
-            self.execute_arithmetic(char)
-        elif char in '&|':
-            if len(self.data_stack) < 2:
-                self.error("Not enough operands for logic operation")
-                return
-            second = self.pop()
-            first = self.pop()
-            if not (isinstance(first, int) and isinstance(second, int)):
-                self.push("")
-            else:
-                if char == '&':
-                    result = 1 if (self.to_bool(first) and self.to_bool(second)) else 0
-                else:  # '|'
-                    result = 1 if (self.to_bool(first) or self.to_bool(second)) else 0
-                self.push(result)
-        elif char == '_':
-            # Null check
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for null check")
-                return
-            value = self.pop()
-            # Return 1 for empty string, 0, or small float
-            if (isinstance(value, str) and value == "") or \
-               (isinstance(value, int) and value == 0) or \
-               (isinstance(value, float) and abs(value) <= EPSILON):
-                self.push(1)
-            else:
-                self.push(0)
-        elif char == '~':
-            # Negation
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for negation")
-                return
-            value = self.pop()
-            if isinstance(value, (int, float)):
-                self.push(-value)
+        else:
+            command = COMMANDS.get(char)
+            if command is not None:
+                command(self, char)
+        # All other characters are ignored (whitespace separators)
+    
+    # Execution mode commands, dispatched through COMMANDS by both engines
+    
+    def _register(self, char: str):
+        # Push register content
+        self.push(self.registers.get(char, ""))
+    
+    def _compare(self, char: str):
+        if len(self.data_stack) < 2:
+            self.error("Not enough operands for comparison")
+            return
+        second = self.pop()
+        first = self.pop()
+        result = self.compare_values(first, second, char)
+        self.push(result)
+    
+    def _logic(self, char: str):
+        if len(self.data_stack) < 2:
+            self.error("Not enough operands for logic operation")
+            return
+        second = self.pop()
+        first = self.pop()
+        self.push(self.logic(first, second, char))
+    
+    def _null_check(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for null check")
+            return
+        self.push(self.null_check(self.pop()))
+    
+    def _negate(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for negation")
+            return
+        self.push(self.negate(self.pop()))
+    
+    def _to_integer(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for integer conversion")
+            return
+        self.push(self.to_integer(self.pop()))
+    
+    def logic(self, first: Value, second: Value, op: str) -> Value:
+        """Result of first & second or first | second"""
+        if not (isinstance(first, int) and isinstance(second, int)):
+            return ""
+        if op == '&':
+            return 1 if (self.to_bool(first) and self.to_bool(second)) else 0
+        # '|'
+        return 1 if (self.to_bool(first) or self.to_bool(second)) else 0
+    
+    def null_check(self, value: Value) -> int:
+        """1 for empty string, 0, or small float"""
+        if (isinstance(value, str) and value == "") or \
+           (isinstance(value, int) and value == 0) or \
+           (isinstance(value, float) and abs(value) <= EPSILON):
+            return 1
+        return 0
+    
+    def negate(self, value: Value) -> Value:
+        if isinstance(value, (int, float)):
+            return -value
+        return ""
+    
+    def to_integer(self, value: Value) -> Value:
+        if isinstance(value, float):
+            return int(value)  # Truncate
+        return ""
+    
+    def _copy(self, char: str):
+        # Copy: n ! copies nth entry from top to top
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for copy")
+            return
+        n = self.pop()
+        if isinstance(n, int) and 1 <= n <= len(self.data_stack):
+            # Copy nth element from top (1-indexed)
+            value = self.data_stack[-(n)]
+            self.push(value)
+        # No effect if n is invalid
+    
+    def _delete(self, char: str):
+        # Delete: n $ removes nth entry from top
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for delete")
+            return
+        n = self.pop()
+        if isinstance(n, int) and 1 <= n <= len(self.data_stack):
+            # Remove nth element from top (1-indexed)
+            index = len(self.data_stack) - n
+            del self.data_stack[index]
+        # No effect if n is invalid
+    
+    def _apply_now(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for apply immediately")
+            return
+        value = self.pop()
+        if isinstance(value, Text):
+            value = str(value)
+        if isinstance(value, str):
+            if self.engine == 'decoded' and self.profiler is None:
+                # The memo needs the generated function to tell pure fragments
+                function = self.fragments.compile(value) if self.memo is not None else self.fragments.function(value, self._applications)
+                if function is not None and (self.max_string_length is None
+                                             or function.longest <= self.max_string_length):
+                    try:
+                        if self.memo is not None and function.pure:
+                            if self.memo.run(function, value, self):
+                                return
+                        elif function(self, self.data_stack, self.registers):
+                            return
+                    except LimitExceeded:
+                        raise
+                    except Exception:
+                        pass  # interpreted below, which reports the error where it occurs
+            # Insert at beginning of command stream
+            if self.profiler is None:
+                self._stream.push_front(value)
             else:
-                self.push("")
-        elif char == '?':
-            # Integer conversion
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for integer conversion")
+                self.profiler.push_front(value, self._stream)
+    
+    def _apply_later(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for apply later")
+            return
+        value = self.pop()
+        if isinstance(value, Text):
+            value = str(value)
+        if isinstance(value, str):
+            # Append to end of command stream
+            self._stream.append(value)
+            if self.profiler is not None:
+                self.profiler.applied(value)
+    
+    def _stack_size(self, char: str):
+        self.push(len(self.data_stack))
+    
+    def _read(self, char: str):
+        # Whatever was written so far (a prompt) must be visible first
+        self.output.flush()
+        try:
+            value = self.parse_input(self.input.readline())
+        except EOFError:
+            value = ""
+        if self.max_string_length is not None and isinstance(value, str) and len(value) > self.max_string_length:
+            raise StringLimitExceeded(f"Input longer than {self.max_string_length} characters",
+                                      self.max_string_length, self)
+        self.push(value)
+    
+    def _write(self, char: str):
+        if len(self.data_stack) < 1:
+            self.error("Not enough operands for output")
+            return
+        self.output.write(self.format_value(self.pop()))
+    
+    def parse_input(self, line: str) -> Value:
+        """Value of an input line: integer, float or string"""
+        line = line.strip()
+        # Try to parse as number first
+        try:
+            # Try integer first
+            if '.' not in line and 'e' not in line.lower():
+                return int(line)
+            return float(line)
+        except ValueError:
+            # Keep as string
+            return line
+    
+    def format_value(self, value: Value) -> str:
+        """Text '"' writes for value"""
+        if isinstance(value, (str, Text)):
+            return str(value)
+        elif isinstance(value, int):
+            return str(value)
+        elif isinstance(value, float):
+            # Avoid unnecessary digits
+            if value == int(value):
+                return str(int(value))
+            return str(value)
+        return ""
+    
+    # Literal ops produced by decode()
+    
+    def _push_literal(self, value: Value):
+        if value.__class__ is str and self.max_string_length is not None and len(value) > self.max_string_length:
+            raise self._string_limit()
+        self.data_stack.append(value)
+    
+    def _push_open_literal(self, literal):
+        # Literal still under construction at the end of its fragment
+        value, mode, text = literal
+        if mode > 0 and self.max_string_length is not None and len(value) > self.max_string_length:
+            raise self._string_limit()
+        self.operation_mode = mode
+        self.data_stack.append(value)
+        self._literal = (text, value)
+    
+    def _push_decimal(self, text: str):
+        value = float(text)
+        self.push(value)
+        self._literal = (text, value)
+    
+    # Superinstructions: decode() fuses common idioms into one op. Each
+    # argument ends with the (command, argument) ops it stands for, which
+    # run one at a time whenever the fused fast path does not apply.
+    
+    def _run_ops(self, ops: tuple):
+        errors = len(self.errors)
+        for command, arg in ops:
+            command(self, arg)
+            # An error stops execution before the rest of the idiom
+            if len(self.errors) != errors:
                 return
-            value = self.pop()
-            if isinstance(value, float):
-                self.push(int(value))  # Truncate
+    
+    def _copy_literal(self, arg):
+        # 'n!'
+        n, _ = arg
+        stack = self.data_stack
+        if 0 < n <= len(stack):
+            stack.append(stack[-n])
+    
+    def _delete_literal(self, arg):
+        # 'n$'
+        n, _ = arg
+        stack = self.data_stack
+        if 0 < n <= len(stack):
+            del stack[-n]
+    
+    def _literal_arithmetic(self, arg):
+        # Literal followed by '+-*/%', as in '1+'
+        value, op, ops = arg
+        stack = self.data_stack
+        if not stack:
+            return self._run_ops(ops)
+        stack.append(self.arithmetic(stack.pop(), value, op))
+    
+    def _copy_arithmetic(self, arg):
+        # 'n!' followed by '+-*/%'
+        n, op, ops = arg
+        stack = self.data_stack
+        if not 0 < n <= len(stack):
+            return self._run_ops(ops)
+        second = stack[-n]
+        stack.append(self.arithmetic(stack.pop(), second, op))
+    
+    def _size_operation(self, arg):
+        # '#' and a literal followed by arithmetic or a comparison, as in '#1-'
+        value, op, ops = arg
+        if op in '=<>':
+            self.data_stack.append(self.compare_values(len(self.data_stack), value, op))
+        else:
+            self.data_stack.append(self.arithmetic(len(self.data_stack), value, op))
+    
+    def _conditional(self, arg):
+        # '4!4$_1+$@': with w x y z on top, leaves w and runs y if w is
+        # non-null, else z
+        ops, = arg
+        stack = self.data_stack
+        if len(stack) < 4:
+            return self._run_ops(ops)
+        w, y, z = stack[-4], stack[-2], stack[-1]
+        stack[-4:] = (w, z if self.null_check(w) else y)
+        self._apply_now('@')
+    
+    def _scan_literal(self) -> bool:
+        """Continue the literal under construction over the current segment in one step
+        
+        Returns False when the next character needs character-level handling
+        (an unexpected stack top, a non-ASCII digit or '.' after an integer).
+        """
+        stream, stack = self._stream, self.data_stack
+        text, pos, mode = stream.text, stream.pos, self.operation_mode
+        if not stack:
+            return False
+        top = stack[-1]
+        if mode > 0:
+            if not isinstance(top, str):
+                return False
+            end, depth = _scan_string(text, pos, mode)
+            if self.max_string_length is not None and \
+                    len(top) + (end if depth else end - 1) - pos > self.max_string_length:
+                raise self._string_limit()
+            stack[-1] = top + text[pos:end if depth else end - 1]
+            self.operation_mode = depth
+            stream.advance_to(end)
+            return True
+        end = DIGITS_RE.match(text, pos).end()
+        if mode == -1:
+            if not isinstance(top, int):
+                return False
+            if end > pos:
+                stack[-1] = top * 10 ** (end - pos) + int(text[pos:end])
+        else:
+            literal = self._literal
+            if not isinstance(top, float) or literal is None or literal[1] is not top:
+                return False
+            if end > pos:
+                stack.pop()
+                self._push_decimal(literal[0] + text[pos:end])
+                self.operation_mode -= end - pos
+        if end < len(text):
+            char = text[end]
+            if char.isdigit() or (char == '.' and mode == -1):
+                stream.advance_to(end)
+                return end > pos
+            # Any other character ends the literal and runs in execution mode
+            self.operation_mode = 0
+        stream.advance_to(end)
+        return True
+    
+    def run(self):
+        """Run the calculator, then flush output"""
+        try:
+            self.execute()
+        finally:
+            self.output.flush()
+    
+    def execute(self):
+        """Run the command stream, leaving buffered output unflushed
+        
+        Raises a LimitExceeded subclass when one of the limits is hit.
+        """
+        steps = self.steps
+        self._deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        try:
+            if self.engine == 'reference':
+                self._run_reference()
+            elif self.profiler is not None:
+                self._run_profiled()
             else:
-                self.push("")
-        elif char == '!':
-            # Copy: n ! copies nth entry from top to top
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for copy")
-                return
-            n = self.pop()
-            if isinstance(n, int) and 1 <= n <= len(self.data_stack):
-                # Copy nth element from top (1-indexed)
-                value = self.data_stack[-(n)]
-                self.push(value)
-            # No effect if n is invalid
-        elif char == '$':
-            # Delete: n $ removes nth entry from top
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for delete")
-                return
-            n = self.pop()
-            if isinstance(n, int) and 1 <= n <= len(self.data_stack):
-                # Remove nth element from top (1-indexed)
-                index = len(self.data_stack) - n
-                del self.data_stack[index]
-            # No effect if n is invalid
-        elif char == '@':
-            # Apply immediately
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for apply immediately")
-                return
-            value = self.pop()
-            if isinstance(value, str):
-                # Insert at beginning of command stream
-                self.command_stream = value + self.command_stream
-        elif char == '\\':
-            # Apply later
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for apply later")
-                return
-            value = self.pop()
-            if isinstance(value, str):
-                # Append to end of command stream
-                self.command_stream = self.command_stream + value
-        elif char == '#':
-            # Stack size
-            self.push(len(self.data_stack))
-        elif char == "'":
-            # Read input
-            try:
-                line = input().strip()
-                # Try to parse as number first
+                self._run_decoded()
+        except LimitExceeded as e:
+            e.steps = self.steps - steps
+            raise
+        finally:
+            # Programs and callers only ever see str
+            stack = self.data_stack
+            for index, value in enumerate(stack):
+                if value.__class__ is Text:
+                    stack[index] = str(value)
+    
+    def _check_limits(self, steps: int) -> int:
+        """Raise if a limit is hit before the next step; the step to check at next"""
+        if self.max_steps is not None and steps >= self.max_steps:
+            raise StepLimitExceeded(f"More than {self.max_steps} steps", self.max_steps, self)
+        if self.max_stack_depth is not None and len(self.data_stack) > self.max_stack_depth:
+            raise StackLimitExceeded(f"Stack deeper than {self.max_stack_depth} entries",
+                                     self.max_stack_depth, self)
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise DeadlineExceeded(f"Run longer than {self.time_limit} seconds", self.time_limit, self)
+        if self.max_stack_depth is None and self._deadline is None:
+            return sys.maxsize if self.max_steps is None else self.max_steps
+        checkpoint = steps + CHECK_INTERVAL
+        if self.max_stack_depth is not None:
+            # Most steps push one entry at most: check more often near the limit
+            checkpoint = min(checkpoint, steps + max(1, self.max_stack_depth - len(self.data_stack)))
+        return checkpoint if self.max_steps is None else min(checkpoint, self.max_steps)
+    
+    def _run_reference(self):
+        """Execute the command stream one character at a time"""
+        stream = self._stream
+        steps = checkpoint = 0
+        try:
+            while stream:
+                if steps >= checkpoint:
+                    checkpoint = self._check_limits(steps)
+                char = stream.next()
+                steps += 1
                 try:
-                    # Try integer first
-                    if '.' not in line and 'e' not in line.lower():
-                        value = int(line)
+                    self.execute_command(char)
+                except LimitExceeded:
+                    raise
+                except Exception as e:
+                    self.error(f"Error executing '{char}': {e}")
+                    break
+        finally:
+            self.steps += steps
+    
+    def _run_decoded(self):
+        """Execute the command stream as decoded fragments"""
+        stream = self._stream
+        fragments = self.fragments
+        steps = checkpoint = 0
+        try:
+            while stream:
+                if self.operation_mode:
+                    if steps >= checkpoint:
+                        checkpoint = self._check_limits(steps)
+                    steps += 1
+                    # A literal left open at a segment boundary continues here
+                    if not self._scan_literal():
+                        char = stream.next()
+                        try:
+                            self.execute_command(char)
+                        except LimitExceeded:
+                            raise
+                        except Exception as e:
+                            self.error(f"Error executing '{char}': {e}")
+                            break
+                    continue
+                text = stream.text
+                ops, index = fragments.get(text, stream.pos)
+                count = len(ops)
+                while index < count:
+                    if steps >= checkpoint:
+                        checkpoint = self._check_limits(steps)
+                    command, arg, end = ops[index]
+                    index += 1
+                    steps += 1
+                    stream.advance_to(end)
+                    try:
+                        command(self, arg)
+                    except LimitExceeded:
+                        raise
+                    except Exception as e:
+                        self.error(f"Error executing '{text[end - 1]}': {e}")
+                        return
+                    # Look the fragment up again once the stream or the mode changed
+                    if self.operation_mode or stream.pos != end or stream.text is not text:
+                        break
+                else:
+                    # Only ignored characters are left in this segment
+                    if stream.text is text:
+                        stream.advance_to(len(text))
+        finally:
+            self.steps += steps
+    
+    def _run_profiled(self):
+        """Execute the command stream as _run_decoded does, timing each op for the profiler"""
+        stream = self._stream
+        fragments = self.fragments
+        profiler = self.profiler
+        clock = time.perf_counter
+        steps = checkpoint = 0
+        profiler.start(stream)
+        try:
+            while stream:
+                profiler.sync(stream)
+                text = stream.text
+                if self.operation_mode:
+                    if steps >= checkpoint:
+                        checkpoint = self._check_limits(steps)
+                    steps += 1
+                    mode = self.operation_mode
+                    path = profiler.path()
+                    start = clock()
+                    try:
+                        if not self._scan_literal():
+                            char = stream.next()
+                            try:
+                                self.execute_command(char)
+                            except LimitExceeded:
+                                raise
+                            except Exception as e:
+                                self.error(f"Error executing '{char}': {e}")
+                                break
+                    finally:
+                        profiler.record('literal', mode, text, path, clock() - start, len(self.data_stack))
+                    continue
+                ops, index = fragments.get(text, stream.pos)
+                count = len(ops)
+                while index < count:
+                    if steps >= checkpoint:
+                        checkpoint = self._check_limits(steps)
+                    command, arg, end = ops[index]
+                    index += 1
+                    steps += 1
+                    if command is Calculator._push_literal:
+                        name = 'string' if arg.__class__ is str else 'number'
+                    elif command is Calculator._push_open_literal or command is Calculator._push_decimal:
+                        name = 'literal'
+                    elif arg.__class__ is tuple:
+                        # Superinstructions go by their source
+                        name = ''.join(text[stream.pos:end].split())
                     else:
-                        value = float(line)
-                except ValueError:
-                    # Keep as string
-                    value = line
-                self.push(value)
-            except EOFError:
-                self.push("")
-        elif char == '"':
-            # Write output
-            if len(self.data_stack) < 1:
-                self.error("Not enough operands for output")
-                return
-            value = self.pop()
-            if isinstance(value, str):
-                print(value, end='')
-            elif isinstance(value, int):
-                print(value, end='')
-            elif isinstance(value, float):
-                # Avoid unnecessary digits
-                if value == int(value):
-                    print(int(value), end='')
+                        name = arg
+                    stream.advance_to(end)
+                    path = profiler.path()
+                    start = clock()
+                    try:
+                        command(self, arg)
+                    except LimitExceeded:
+                        raise
+                    except Exception as e:
+                        self.error(f"Error executing '{text[end - 1]}': {e}")
+                        return
+                    finally:
+                        profiler.record(name, 0, text, path, clock() - start, len(self.data_stack))
+                    if self.operation_mode or stream.pos != end or stream.text is not text:
+                        break
                 else:
-                    print(value, end='')
-        # All other characters are ignored (whitespace separators)
+                    if stream.text is text:
+                        stream.advance_to(len(text))
+        finally:
+            self.steps += steps
     
-    def run(self):
-        """Run the calculator"""
-        while self.command_stream:
-            char = self.command_stream[0]
-            self.command_stream = self.command_stream[1:]
-            try:
-                self.execute_command(char)
-            except Exception as e:
-                self.error(f"Error executing '{char}': {e}")
-                break
+    def evaluate_vectorized(self, program: str, **registers):
+        """Evaluate a numeric program over NumPy arrays of register values
+        
+        evaluate_vectorized("A B+2*", A=a, B=b) runs the program once for
+        all rows instead of once per row and returns the top of the stack
+        as a masked array, masked where a row's result is a string (a
+        division by zero, '%' on floats, ...). Only number literals, the
+        given registers, '+-*/%', comparisons, '~' and '!'/'$' after an
+        integer literal are allowed (ValueError otherwise). Integers are
+        int64 and wrap on overflow. Requires NumPy.
+        """
+        return VectorEvaluator(registers).evaluate(program)
     
     def interactive_mode(self):
         """Run calculator in interactive mode for testing"""
@@ -546,8 +1491,730 @@ class Calculator:
             except EOFError:
                 break
 
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Execution mode command characters; anything not listed (and not a
+# literal) is ignored
+COMMANDS = {char: Calculator._register for char in LETTERS}
+COMMANDS.update({char: Calculator._compare for char in '=<>'})
+COMMANDS.update({char: Calculator.execute_arithmetic for char in '+-*/%'})
+COMMANDS.update({char: Calculator._logic for char in '&|'})
+COMMANDS.update({
+    '_': Calculator._null_check, '~': Calculator._negate, '?': Calculator._to_integer,
+    '!': Calculator._copy, '$': Calculator._delete,
+    '@': Calculator._apply_now, '\\': Calculator._apply_later,
+    '#': Calculator._stack_size, "'": Calculator._read, '"': Calculator._write,
+})
+
+def decode(text: str, pos: int = 0) -> tuple:
+    """Decode text[pos:], read in execution mode, into (command, argument, end) ops.
+    
+    `end` is the position just past the op. Number and string literals
+    fold into one push; a literal still open at the end of the text (or
+    cut short by a non-ASCII digit) also leaves its construction mode set,
+    exactly as executing it character by character would. Common idioms
+    are then fused into superinstructions.
+    """
+    ops = []
+    append = ops.append
+    n = len(text)
+    while pos < n:
+        char = text[pos]
+        command = COMMANDS.get(char)
+        if command is not None:
+            pos += 1
+            append((command, char, pos))
+        elif '0' <= char <= '9' or char == '.':
+            pos = _decode_number(text, pos, append)
+        elif char == '(':
+            pos = _decode_string(text, pos, append)
+        elif char.isdigit():
+            # Other Unicode digits keep character-level semantics
+            pos += 1
+            append((Calculator.execute_command, char, pos))
+        else:
+            pos += 1
+    return tuple(fuse(ops))
+
+# Literals in the conditional idiom must be ints: '4.0!' is not '4!'
+CONDITIONAL = (
+    (Calculator._push_literal, 4, int), (Calculator._copy, '!', str),
+    (Calculator._push_literal, 4, int), (Calculator._delete, '$', str),
+    (Calculator._null_check, '_', str), (Calculator._push_literal, 1, int),
+    (Calculator.execute_arithmetic, '+', str), (Calculator._delete, '$', str),
+    (Calculator._apply_now, '@', str),
+)
+
+def fuse(ops: list) -> list:
+    """Replace idioms in decoded ops by superinstructions
+    
+    A superinstruction spans the ops it replaces, ends where the last of
+    them ends and carries them as (command, argument) pairs.
+    """
+    fused = []
+    i, count = 0, len(ops)
+    while i < count:
+        command, arg, _ = ops[i]
+        following = ops[i + 1][0] if i + 1 < count else None
+        third = ops[i + 2] if i + 2 < count else (None, None, None)
+        size = 1
+        if command is Calculator._push_literal:
+            if arg.__class__ is int and \
+                    tuple((c, a, a.__class__) for c, a, _ in ops[i:i + 9]) == CONDITIONAL:
+                superinstruction, params, size = Calculator._conditional, (), 9
+            elif arg.__class__ is int and following is Calculator._copy:
+                if third[0] is Calculator.execute_arithmetic:
+                    superinstruction, params, size = Calculator._copy_arithmetic, (arg, third[1]), 3
+                else:
+                    superinstruction, params, size = Calculator._copy_literal, (arg,), 2
+            elif arg.__class__ is int and following is Calculator._delete:
+                superinstruction, params, size = Calculator._delete_literal, (arg,), 2
+            elif following is Calculator.execute_arithmetic:
+                superinstruction, params, size = Calculator._literal_arithmetic, (arg, ops[i + 1][1]), 2
+        elif command is Calculator._stack_size and following is Calculator._push_literal and \
+                third[0] in (Calculator.execute_arithmetic, Calculator._compare):
+            superinstruction, params, size = Calculator._size_operation, (ops[i + 1][1], third[1]), 3
+        if size == 1:
+            fused.append(ops[i])
+        else:
+            window = ops[i:i + size]
+            fused.append((superinstruction, params + (tuple((c, a) for c, a, _ in window),), window[-1][2]))
+        i += size
+    return fused
+
+NUMBER_RE = re.compile(r'[0-9]+(?:\.[0-9]*)?|\.[0-9]*')
+DIGITS_RE = re.compile(r'[0-9]*')
+PARENS_RE = re.compile(r'[()]')
+
+def _decode_number(text: str, pos: int, append) -> int:
+    # The value is parsed from the literal's text; mode is the construction
+    # mode executing it character by character would end in
+    literal = NUMBER_RE.match(text, pos).group()
+    end = pos + len(literal)
+    point = literal.find('.')
+    if point < 0:
+        value, mode = int(literal), -1
+    else:
+        if point == 0:
+            literal = '0' + literal
+            point = 1
+        value, mode = float(literal), point - len(literal) - 1
+        if math.isinf(value):
+            # Too large for a float: executing the digits one by one
+            # fails at the '.' with the error the reference reports
+            for index in range(pos, end):
+                append((Calculator.execute_command, text[index], index + 1))
+            return end
+    if end == len(text) or text[end].isdigit():
+        append((Calculator._push_open_literal, (value, mode, literal), end))
+    else:
+        append((Calculator._push_literal, value, end))
+    return end
+
+def _scan_string(text: str, pos: int, depth: int):
+    """Scan string construction at the given depth: (end, depth left)
+    
+    Stops just past the ')' closing the string, or at the end of text.
+    """
+    search = PARENS_RE.search
+    while True:
+        match = search(text, pos)
+        if match is None:
+            return len(text), depth
+        pos = match.end()
+        if match.group() == '(':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos, 0
+
+def _decode_string(text: str, pos: int, append) -> int:
+    start = pos + 1
+    end, depth = _scan_string(text, start, 1)
+    if depth:
+        append((Calculator._push_open_literal, (text[start:], depth, None), end))
+    else:
+        append((Calculator._push_literal, text[start:end - 1], end))
+    return end
+
+class FragmentCompiler:
+    """Generates a Python function for a straight-line fragment
+    
+    Straight-line fragments only push literals and registers, compute
+    ('+-*/%', comparisons, '&|', '_', '~', '?', '#') and shuffle with '!'
+    or '$' after an integer literal: no I/O, no '@' or '\\', no literal
+    left open. Their stack effect is known, so the stack is modelled
+    symbolically: intermediate values live in locals, the depth is
+    checked once on entry and results are written back in one slice
+    assignment. The function returns False, touching nothing, when the
+    stack is too shallow; nothing is written before the last line, so
+    on an exception the caller can interpret the fragment instead.
+    """
+    MAX_ENTRIES = 32  # deepest stack entry a fragment may reach
+    
+    def __init__(self):
+        self.stack = []    # (expression, type, constant) for each modelled value
+        self.entries = 0   # entries taken from the calculator's stack
+        self.temps = 0
+        self.lines = []
+        self.pure = True   # depends on nothing but the entries it takes
+        self.longest = 0   # length of the longest string literal
+    
+    def compile(self, ops: tuple):
+        """Function(calc, stack, registers) -> bool for ops, or None
+        
+        The function's `entries` is the number of stack entries it takes,
+        `pure` tells whether its results depend on those alone and
+        `longest` is the length of its longest string literal.
+        """
+        if not ops:
+            return None
+        for command, arg, end in ops:
+            handler = self.HANDLERS.get(command)
+            if handler is None or handler(self, arg) is False:
+                return None
+        namespace = {}
+        exec(compile(self.source(), '<fragment>', 'exec'), namespace)
+        function = namespace['fragment']
+        function.entries, function.pure, function.longest = self.entries, self.pure, self.longest
+        return function
+    
+    def source(self) -> str:
+        lines = ['def fragment(calc, stack, registers):', '    depth = len(stack)']
+        if self.entries:
+            lines += [f'    if depth < {self.entries}:', '        return False']
+            if self.entries == 1:
+                lines.append('    a0 = stack[-1]')
+            else:
+                names = ', '.join(f'a{i}' for i in reversed(range(self.entries)))
+                lines.append(f'    {names} = stack[-{self.entries}:]')
+        lines += ['    ' + line for line in self.lines]
+        # Entries still in place at the bottom need not be written back
+        keep = 0
+        while keep < min(self.entries, len(self.stack)) and \
+                self.stack[keep][0] == f'a{self.entries - 1 - keep}':
+            keep += 1
+        results = ', '.join(expr for expr, _, _ in self.stack[keep:])
+        removed = self.entries - keep
+        if removed:
+            lines.append(f'    stack[depth - {removed}:] = [{results}]')
+        elif len(self.stack) - keep == 1:
+            lines.append(f'    stack.append({results})')
+        elif results:
+            lines.append(f'    stack.extend(({results}))')
+        lines.append('    return True')
+        return '\n'.join(lines) + '\n'
+    
+    def reach(self, count: int) -> bool:
+        """Model at least count values, taking entries from the real stack"""
+        while len(self.stack) < count:
+            if self.entries == self.MAX_ENTRIES:
+                return False
+            self.stack.insert(0, (f'a{self.entries}', None, None))
+            self.entries += 1
+        return True
+    
+    def pop(self):
+        return self.stack.pop() if self.stack or self.reach(1) else None
+    
+    def push(self, expr: str, kind=None):
+        # Every computed value gets its own local
+        name = f't{self.temps}'
+        self.temps += 1
+        self.lines.append(f'{name} = {expr}')
+        self.stack.append((name, kind, None))
+    
+    def literal(self, value: Value):
+        if value.__class__ is str:
+            self.longest = max(self.longest, len(value))
+        self.stack.append((repr(value), type(value), value))
+    
+    def register(self, char: str):
+        # Registers can be changed from outside between runs
+        self.pure = False
+        self.push(f'registers.get({char!r}, "")')
+    
+    def arithmetic(self, op: str):
+        second, first = self.pop(), self.pop()
+        if first is None or second is None:
+            return False
+        (a, a_kind, _), (b, b_kind, b_value) = first, second
+        if a_kind is int and b_kind is int:
+            if op in '+-*':
+                return self.push(f'{a} {op} {b}', int)
+            if b_value:
+                # Nonzero constant divisor: no zero check needed
+                return self.push(f'{a} {op} {b}', float if op == '/' else int)
+        elif a_kind is float and b_kind is float and op in '+-*':
+            return self.push(f'{a} {op} {b}', float)
+        self.push(f'calc.arithmetic({a}, {b}, {op!r})')
+    
+    def compare(self, op: str):
+        second, first = self.pop(), self.pop()
+        if first is None or second is None:
+            return False
+        if first[1] is int and second[1] is int:
+            return self.push(f'1 if {first[0]} {"==" if op == "=" else op} {second[0]} else 0', int)
+        self.push(f'calc.compare_values({first[0]}, {second[0]}, {op!r})', int)
+    
+    def logic(self, op: str):
+        second, first = self.pop(), self.pop()
+        if first is None or second is None:
+            return False
+        if first[1] is int and second[1] is int:
+            word = 'and' if op == '&' else 'or'
+            return self.push(f'1 if {first[0]} {word} {second[0]} else 0', int)
+        self.push(f'calc.logic({first[0]}, {second[0]}, {op!r})')
+    
+    def null_check(self, char: str):
+        value = self.pop()
+        if value is None:
+            return False
+        if value[1] is int:
+            return self.push(f'1 if {value[0]} == 0 else 0', int)
+        if value[1] is str:
+            return self.push(f'1 if {value[0]} == "" else 0', int)
+        self.push(f'calc.null_check({value[0]})', int)
+    
+    def negate(self, char: str):
+        value = self.pop()
+        if value is None:
+            return False
+        if value[1] in (int, float):
+            return self.push(f'-{value[0]}', value[1])
+        self.push(f'calc.negate({value[0]})')
+    
+    def to_integer(self, char: str):
+        value = self.pop()
+        if value is None:
+            return False
+        if value[1] is float:
+            return self.push(f'int({value[0]})', int)
+        self.push(f'calc.to_integer({value[0]})')
+    
+    def stack_size(self, char: str):
+        # Entries not yet taken are still on the real stack
+        self.pure = False
+        offset = len(self.stack) - self.entries
+        self.push(f'depth + {offset}' if offset else 'depth', int)
+    
+    def copy(self, char: str):
+        n = self.pop()
+        if n is None or n[2] is None:
+            return False
+        if n[1] is int and n[2] >= 1:
+            if not self.reach(n[2]):
+                return False
+            self.stack.append(self.stack[-n[2]])
+    
+    def delete(self, char: str):
+        n = self.pop()
+        if n is None or n[2] is None:
+            return False
+        if n[1] is int and n[2] >= 1:
+            if not self.reach(n[2]):
+                return False
+            del self.stack[-n[2]]
+    
+    def superinstruction(self, arg):
+        # Compiled from the ops it stands for
+        for command, sub in arg[-1]:
+            handler = self.HANDLERS.get(command)
+            if handler is None or handler(self, sub) is False:
+                return False
+    
+    HANDLERS = {
+        Calculator._push_literal: literal,
+        Calculator._register: register,
+        Calculator.execute_arithmetic: arithmetic,
+        Calculator._compare: compare,
+        Calculator._logic: logic,
+        Calculator._null_check: null_check,
+        Calculator._negate: negate,
+        Calculator._to_integer: to_integer,
+        Calculator._stack_size: stack_size,
+        Calculator._copy: copy,
+        Calculator._delete: delete,
+        Calculator._copy_literal: superinstruction,
+        Calculator._delete_literal: superinstruction,
+        Calculator._literal_arithmetic: superinstruction,
+        Calculator._copy_arithmetic: superinstruction,
+        Calculator._size_operation: superinstruction,
+    }
+
+class VectorEvaluator:
+    """Evaluates a numeric program once over NumPy arrays of register values
+    
+    Numeric programs only push number literals and registers, compute
+    ('+-*/%', comparisons, '~') and shuffle with '!' or '$' after an
+    integer literal. Each stack slot is (values, empty, constant): an
+    int64 or float64 array, a boolean mask of the rows holding "" under
+    the empty-string rule (None when no row does) and the literal value
+    for constants. Rows where "" would meet '+' or '*' and turn into a
+    non-empty string are recomputed by the interpreter at the end.
+    """
+    
+    def __init__(self, registers: dict):
+        import numpy
+        self.np = numpy
+        self.registers = {}
+        for name, values in registers.items():
+            if name not in LETTERS:
+                raise ValueError(f"Not a register: {name}")
+            values = numpy.atleast_1d(numpy.asarray(values))
+            if values.dtype.kind in 'biu':
+                values = values.astype(numpy.int64)
+            elif values.dtype.kind == 'f':
+                values = values.astype(numpy.float64)
+            else:
+                raise ValueError(f"Register {name} must hold numbers")
+            self.registers[name] = values
+        self.shape = numpy.broadcast_shapes(*(v.shape for v in self.registers.values())) \
+            if self.registers else (1,)
+        self.stack = []
+        self.recompute = None  # rows the interpreter has to evaluate
+    
+    def evaluate(self, program: str):
+        """Top of the stack after program, masked where it is a string"""
+        np = self.np
+        self.run(decode(program))
+        if not self.stack:
+            raise ValueError("Program leaves the stack empty")
+        values, empty, _ = self.stack[-1]
+        values = np.array(np.broadcast_to(values, self.shape))
+        empty = np.zeros(self.shape, bool) if empty is None else np.array(np.broadcast_to(empty, self.shape))
+        if self.recompute is not None:
+            calc = Calculator(output=CaptureOutput(), input=PreReadInput(""))
+            for row in zip(*np.nonzero(np.broadcast_to(self.recompute, self.shape))):
+                calc.reset()
+                for name, column in self.registers.items():
+                    calc.registers[name] = np.broadcast_to(column, self.shape)[row].item()
+                calc.command_stream = program
+                calc.run()
+                value = calc.data_stack[-1] if calc.data_stack else ""
+                if isinstance(value, str):
+                    empty[row] = True
+                    continue
+                if values.dtype.kind != 'O' and (values.dtype.kind == 'i') != isinstance(value, int):
+                    # This row's number has the other type
+                    values = values.astype(object)
+                values[row] = value
+                empty[row] = False
+        return np.ma.MaskedArray(values, mask=empty)
+    
+    def run(self, ops):
+        for op in ops:
+            command, arg = op[0], op[1]
+            if command is Calculator._push_open_literal and arg[2] is not None:
+                # A number ending the program
+                command, arg = Calculator._push_literal, arg[0]
+            handler = self.HANDLERS.get(command)
+            if handler is None:
+                raise ValueError(f"Cannot evaluate {command.__name__.strip('_')} on arrays")
+            handler(self, arg)
+    
+    def pop(self):
+        if not self.stack:
+            raise ValueError("Stack underflow")
+        return self.stack.pop()
+    
+    def rows(self, empty):
+        """Mask of the rows holding "", usable in boolean expressions"""
+        return self.np.bool_(False) if empty is None else empty
+    
+    def codes(self, values, empty):
+        """Rows holding a character code, an integer from 0 to 128"""
+        if values.dtype.kind != 'i':
+            return self.np.bool_(False)
+        return (0 <= values) & (values <= 128) & ~empty
+    
+    def either(self, first, second):
+        """Mask of rows where either mask is set"""
+        if first is None:
+            return second
+        return first if second is None else first | second
+    
+    def mark(self, rows):
+        self.recompute = rows if self.recompute is None else self.recompute | rows
+    
+    def literal(self, value: Value):
+        if isinstance(value, str):
+            raise ValueError("Cannot evaluate strings on arrays")
+        self.stack.append((self.np.asarray(value, self.np.int64 if isinstance(value, int) else self.np.float64),
+                           None, value))
+    
+    def register(self, char: str):
+        if char not in self.registers:
+            raise ValueError(f"No array given for register {char}")
+        self.stack.append((self.registers[char], None, None))
+    
+    def arithmetic(self, op: str):
+        np = self.np
+        second, second_empty, _ = self.pop()
+        first, first_empty, _ = self.pop()
+        first_rows, second_rows = self.rows(first_empty), self.rows(second_empty)
+        empty = self.either(first_empty, second_empty)
+        if op == '+' and empty is not None:
+            # "" + number is the number as a string
+            self.mark(first_rows ^ second_rows)
+        elif op == '*' and empty is not None:
+            # "" * character code is that character
+            self.mark(first_rows & self.codes(second, second_rows) |
+                      second_rows & self.codes(first, first_rows))
+        with np.errstate(all='ignore'):
+            if op == '+':
+                values = first + second
+            elif op == '-':
+                values = first - second
+            elif op == '*':
+                values = first * second
+            elif op == '/':
+                if empty is not None:
+                    # "" / "" is the position of "" in "", 0
+                    self.mark(first_rows & second_rows)
+                zero = np.abs(second) < EPSILON
+                values = first / np.where(zero, 1, second)
+                empty = self.either(empty, zero)
+            elif first.dtype.kind == 'i' and second.dtype.kind == 'i':
+                zero = second == 0
+                values = np.remainder(first, np.where(zero, 1, second))
+                empty = self.either(empty, zero)
+            else:
+                # Modulo is undefined for floats
+                values = np.zeros(np.broadcast_shapes(first.shape, second.shape), np.int64)
+                empty = np.ones(values.shape, bool)
+        self.stack.append((values, empty, None))
+    
+    def compare(self, op: str):
+        np = self.np
+        second, second_empty, _ = self.pop()
+        first, first_empty, _ = self.pop()
+        with np.errstate(all='ignore'):
+            if first.dtype.kind == 'i' and second.dtype.kind == 'i':
+                result = first == second if op == '=' else (first < second if op == '<' else first > second)
+            else:
+                a, b = first.astype(np.float64), second.astype(np.float64)
+                diff = np.abs(a - b)
+                threshold = np.where((np.abs(a) <= 1.0) & (np.abs(b) <= 1.0),
+                                     EPSILON, EPSILON * np.maximum(np.abs(a), np.abs(b)))
+                if op == '=':
+                    result = diff <= threshold
+                else:
+                    result = ((a < b) if op == '<' else (a > b)) & (diff > threshold)
+        empty = self.either(first_empty, second_empty)
+        if empty is not None:
+            # A string and a number only compare as '<'; "" equals ""
+            both = self.rows(first_empty) & self.rows(second_empty)
+            result = np.where(empty, ~both if op == '<' else (both if op == '=' else False), result)
+        self.stack.append((result.astype(np.int64), None, None))
+    
+    def negate(self, char: str):
+        values, empty, constant = self.pop()
+        self.stack.append((-values, empty, None if constant is None else -constant))
+    
+    def superinstruction(self, arg):
+        self.run(arg[-1])
+    
+    def shuffle(self, char: str):
+        n = self.pop()[2]
+        if n is None:
+            raise ValueError(f"'{char}' needs a literal position")
+        if isinstance(n, int) and 1 <= n <= len(self.stack):
+            if char == '!':
+                self.stack.append(self.stack[-n])
+            else:
+                del self.stack[-n]
+    
+    HANDLERS = {
+        Calculator._push_literal: literal,
+        Calculator._register: register,
+        Calculator.execute_arithmetic: arithmetic,
+        Calculator._compare: compare,
+        Calculator._negate: negate,
+        Calculator._copy: shuffle,
+        Calculator._delete: shuffle,
+        Calculator._copy_literal: superinstruction,
+        Calculator._delete_literal: superinstruction,
+        Calculator._literal_arithmetic: superinstruction,
+        Calculator._copy_arithmetic: superinstruction,
+    }
+
+def run_pipe(program: str, infile=None, outfile=None, errfile=None):
+    """Run program once per line of infile, writing one result line each
+    
+    Each record is parsed like "'" input and is the only value on the
+    stack when program starts; the result line is the top of the stack
+    as '"' writes it (empty if the stack is empty), with backslashes,
+    newlines and carriage returns escaped as \\\\, \\n and \\r. What the
+    program writes with '"' and error messages go to errfile (default:
+    stderr), so each record gives exactly one line. Registers are set up
+    once, records are streamed and output is buffered, so memory stays
+    constant however many records go through.
+    """
+    infile = infile if infile is not None else sys.stdin
+    output = BufferedOutput(outfile, size=1 << 16)
+    calc = Calculator(output=BufferedOutput(errfile if errfile is not None else sys.stderr),
+                      input=PreReadInput(""))
+    stack, registers = calc.data_stack, calc.registers
+    # A straight-line program runs as its generated function, as with '@'
+    function = calc.fragments.compile(program)
+    for line in infile:
+        stack.clear()
+        calc.errors.clear()
+        stack.append(calc.parse_input(line))
+        try:
+            done = function is not None and function(calc, stack, registers)
+        except Exception:
+            done = False
+        if not done:
+            calc.operation_mode = 0
+            calc.command_stream = program
+            calc.execute()
+        output.write(_escape_line(calc.format_value(stack[-1])) + "\n" if stack else "\n")
+    output.flush()
+    calc.output.flush()
+
+def _escape_line(text: str) -> str:
+    # A pipe result stays on one line
+    if '\n' in text or '\r' in text or '\\' in text:
+        return text.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+def load_batch(source: str) -> List[dict]:
+    """Jobs from a directory of program files or a JSONL file
+    
+    A directory gives one job per regular file, in name order, with the
+    file name as id. Each JSONL line is an object with "program" and
+    optional "id" (default: line number), "input" (text served to "'")
+    and limits (see BATCH_LIMITS).
+    """
+    if os.path.isdir(source):
+        jobs = []
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and not name.startswith('.'):
+                with open(path, 'r') as f:
+                    jobs.append({'id': name, 'program': f.read()})
+        return jobs
+    jobs = []
+    with open(source, 'r') as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                job = json.loads(line)
+                job.setdefault('id', number)
+                jobs.append(job)
+    return jobs
+
+_batch_calculator = None  # one per worker process, reset between jobs
+
+# Calculator limits a batch job may set, as keys of the job
+BATCH_LIMITS = ('max_steps', 'max_stack_depth', 'max_string_length', 'time_limit')
+
+def _start_batch_worker():
+    global _batch_calculator
+    _batch_calculator = Calculator(output=CaptureOutput(), input=PreReadInput(""))
+
+def run_batch_job(job: dict) -> dict:
+    """Run one job on this process's calculator and describe the outcome"""
+    if _batch_calculator is None:
+        _start_batch_worker()
+    calc = _batch_calculator
+    calc.reset()
+    calc.output.clear()
+    calc.input = PreReadInput(job.get('input', ""))
+    for name in BATCH_LIMITS:
+        setattr(calc, name, job.get(name))
+    calc.command_stream = job['program']
+    stopped = None
+    start = time.perf_counter()
+    try:
+        calc.run()
+    except LimitExceeded as e:
+        stopped = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    return {
+        'id': job['id'],
+        'stack': list(calc.data_stack),
+        'output': calc.output.getvalue(),
+        'errors': list(calc.errors),
+        'stopped': stopped,
+        'steps': calc.steps,
+        'seconds': round(seconds, 6),
+    }
+
+def run_batch(source: str, jobs: int = None, outfile=None, limits: dict = None):
+    """Run every program in source, writing one JSON result line per job
+    
+    Programs are independent, so they are spread over a process pool of
+    jobs workers (default: one per CPU), each reusing one calculator.
+    Results are written in input order; jobs=1 runs in this process.
+    limits (keys of BATCH_LIMITS) apply to every job that does not set
+    its own; a job stopped by one has its reason in "stopped".
+    """
+    outfile = outfile if outfile is not None else sys.stdout
+    batch = load_batch(source)
+    if limits:
+        batch = [{**limits, **job} for job in batch]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        results = map(run_batch_job, batch)
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(jobs, initializer=_start_batch_worker)
+        # Large chunks keep the pickling overhead per job small
+        chunksize = max(1, min(64, len(batch) // (jobs * 4)))
+        results = pool.map(run_batch_job, batch, chunksize=chunksize)
+    try:
+        for result in results:
+            try:
+                line = json.dumps(result)
+            except ValueError as e:
+                # e.g. an int with more digits than str() converts
+                line = json.dumps({**result, 'stack': None,
+                                   'errors': result['errors'] + [f"Stack not serializable: {e}"]})
+            outfile.write(line + "\n")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    outfile.flush()
+
+def run_profile(program: str, folded: str = 'calculator.folded') -> Profiler:
+    """Run program with profiling, print the report and write folded stacks to folded"""
+    calc = Calculator(output=BufferedOutput(), profile=True)
+    calc.command_stream = program
+    calc.run()
+    print()
+    print(calc.profiler.report())
+    with open(folded, 'w') as file:
+        calc.profiler.write_folded(file)
+    print(f"Folded stacks written to {folded}")
+    return calc.profiler
+
 def main():
-    calc = Calculator()
+    if len(sys.argv) > 2 and sys.argv[1] == '--pipe':
+        run_pipe(sys.argv[2])
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        options = dict(zip(sys.argv[3::2], sys.argv[4::2]))
+        jobs = int(options['--jobs']) if '--jobs' in options else None
+        limits = {}
+        if '--max-steps' in options:
+            limits['max_steps'] = int(options['--max-steps'])
+        if '--time-limit' in options:
+            limits['time_limit'] = float(options['--time-limit'])
+        if '--out' in options:
+            with open(options['--out'], 'w') as outfile:
+                run_batch(sys.argv[2], jobs, outfile, limits)
+        else:
+            run_batch(sys.argv[2], jobs, limits=limits)
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '-profile':
+        run_profile(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'calculator.folded')
+        return
+    
+    calc = Calculator(output=BufferedOutput())
     
     if len(sys.argv) > 1:
         if sys.argv[1] == '-i':
@@ -559,10 +2226,13 @@ def main():
             # Run demonstration
             run_demonstrations()
         else:
-            print("Usage: python calculator.py [-i|-test|-demo]")
-            print("  -i     : Interactive mode")
-            print("  -test  : Run quick tests")
-            print("  -demo  : Run demonstrations")
+            print("Usage: python calculator.py [-i|-test|-demo|-profile PROGRAM [FOLDED]|--pipe PROGRAM|--batch SOURCE [--jobs N] [--out FILE] [--max-steps N] [--time-limit SECONDS]]")
+            print("  -i      : Interactive mode")
+            print("  -test   : Run quick tests")
+            print("  -demo   : Run demonstrations")
+            print("  -profile: Run PROGRAM, print a profile and write folded stacks to FOLDED (calculator.folded)")
+            print("  --pipe  : Run PROGRAM on each line of stdin, one result line each")
+            print("  --batch : Run the programs in a directory or JSONL file on N processes, one JSON result line each")
     else:
         # Run startup program from register 'a'
         calc.run()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Differential Fuzzer for the Calculator Engines
+LVA 185.208 Programming Languages - Task 1
+
+Generates random programs from the grammar of the postfix language, runs
+each under every engine configuration with the same limits and checks
+that they all end in the state the reference engine (the character loop
+over execute_command) ends in. Divergences are shrunk to a minimal
+reproducer. The time of each engine is recorded per program.
+
+    python tests/fuzz_engines.py [--seed N] [--count N] [--max-steps N] [--out FILE]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+# Add parent directory to path to import calculator
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from calculator import Calculator, CaptureOutput, PreReadInput, LimitExceeded, LETTERS
+
+# Calculator keyword arguments of each execution path; the first is the oracle
+ENGINES = {
+    'reference': {'engine': 'reference'},
+    'decoded': {},                   # fragments, superinstructions and compiled '@'
+    'memo': {'memo_size': 256},      # plus memoized pure fragments
+    'profile': {'profile': True},    # the profiled loop, fragments interpreted
+}
+INPUT = ["12", "3.5", "abc", "", "(1)(2)+", "-4", "1 2+"]
+
+OPERATORS = "+-*/%=<>&|_~?!$#'\"@\\"
+EDGE_CASES = (
+    "0/", "0%", "0.0/", "1.5 0%", "7 2%", "()(x)/", "(abc)(c)/", "(abc)0%", "(abc)9%",
+    "(abc)2-", "2(abc)-", "(abc)66*", "66(abc)*", "(ab)200*", "1.5?", "~", "()~", "()_",
+    "0.0_", "1 1.0=", "(a)(b)<", "99999999999999999999 2*", "0.1 0.2+", "-", "@", "\\", "#!", "#$",
+)
+IDIOMS = ("2!", "1$", "#1-", "#2<", "2!+", "1+", "3!-", "4!4$_1+$@", "1!@", "1!\\")
+# Characters execution mode ignores, and digits that are not ASCII
+OTHER = (" ", " ", "\n", ",", "[", "é", "٣", "²")
+
+
+class ProgramGenerator:
+    """Random programs of the postfix language from its grammar
+    
+    A program is a sequence of number and decimal literals, nested string
+    literals, operators, register names, idioms the decoder fuses, edge
+    cases of the arithmetic and ignored characters. Strings are mostly
+    programs themselves so that '@' and '\\' run them; unbalanced
+    parentheses leave construction modes open across segments.
+    """
+    
+    def __init__(self, rng: random.Random, max_depth: int = 3):
+        self.rng = rng
+        self.max_depth = max_depth
+    
+    def program(self, depth: int = 0, size: int = None) -> str:
+        rng = self.rng
+        if size is None:
+            size = rng.randint(1, 24 if depth == 0 else 8)
+        items = [self.item(depth) for _ in range(size)]
+        if depth == 0:
+            # Operands first, or most programs would stop at an underflow
+            items[:0] = [rng.choice((self.number, self.decimal, lambda: self.string(1)))()
+                         for _ in range(rng.randint(0, 4))]
+        separator = ' ' if rng.random() < 0.3 else ''
+        return separator.join(items)
+    
+    def item(self, depth: int) -> str:
+        rng = self.rng
+        k = rng.random()
+        if k < 0.2:
+            return self.number()
+        if k < 0.27:
+            return self.decimal()
+        if k < 0.42 and depth < self.max_depth:
+            return self.string(depth)
+        if k < 0.47 and depth < self.max_depth:
+            return self.conditional(depth)
+        if k < 0.49:
+            return self.loop(depth)
+        if k < 0.67:
+            return rng.choice(OPERATORS)
+        if k < 0.75:
+            return rng.choice(LETTERS)
+        if k < 0.83:
+            return rng.choice(IDIOMS)
+        if k < 0.93:
+            return rng.choice(EDGE_CASES)
+        if k < 0.95:
+            return rng.choice("()")  # unbalanced
+        return rng.choice(OTHER)
+    
+    def number(self) -> str:
+        rng = self.rng
+        k = rng.random()
+        if k < 0.6:
+            return str(rng.randint(0, 9))
+        if k < 0.9:
+            return str(rng.randint(10, 300))
+        return rng.choice(("007", "10000000000000000000000", "65", "128", "129"))
+    
+    def decimal(self) -> str:
+        rng = self.rng
+        return rng.choice((f"{rng.randint(0, 20)}.{rng.randint(0, 99)}", ".5", "2.", ".", "1.2.3", "0.000",
+                           "1" * 400 + ".5"))  # too large for a float
+    
+    def string(self, depth: int) -> str:
+        rng = self.rng
+        if rng.random() < 0.2:
+            return "(" + ''.join(rng.choice("abcxyz ()0123456789") for _ in range(rng.randint(0, 6))) + ")"
+        return "(" + self.program(depth + 1) + ")"
+    
+    def loop(self, depth: int) -> str:
+        """A countdown driven by '\\' or '@' running a body each time, or an endless loop"""
+        rng = self.rng
+        if rng.random() < 0.1:
+            return rng.choice(("(1!\\)1!\\", "(1!@)1!@", "(2!2!+)1!\\"))
+        body = self.program(self.max_depth, rng.randint(0, 3)) + " " if rng.random() < 0.5 else ""
+        apply = rng.choice("@\\")
+        return f"{rng.randint(0, 30)}(2!1-3$2!3$2!({body}1!{apply})()3!4$_1+$@)1!{apply}"
+    
+    def conditional(self, depth: int) -> str:
+        """cond (then)(else) followed by the repo's conditional idiom"""
+        return (self.number() + self.string(depth) + self.string(depth)
+                + self.rng.choice(("3!4$_1+$@", "(4!4$_1+$@)@", "4!4$_1+$@")))
+
+
+def _normalize(value):
+    if isinstance(value, float):
+        return ('float', 'nan' if math.isnan(value) else repr(value))
+    return (type(value).__name__, value)
+
+def run_engine(program: str, options: dict, limits: dict, inputs: List[str] = INPUT) -> tuple:
+    """(state the run ended in, seconds) of program on one engine"""
+    calc = Calculator(output=CaptureOutput(), input=PreReadInput(list(inputs)), **options, **limits)
+    calc.command_stream = program
+    stopped = None
+    start = time.perf_counter()
+    try:
+        calc.run()
+    except LimitExceeded as e:
+        stopped = type(e).__name__
+    except Exception as e:  # a crash is a divergence from the reference, not a fuzzer failure
+        stopped = f"crash: {type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    state = (
+        stopped,
+        [_normalize(value) for value in calc.data_stack],
+        calc.output.getvalue(),
+        calc.operation_mode,
+        sorted((name, _normalize(value)) for name, value in calc.registers.items()),
+        calc.command_stream,
+    )
+    return state, elapsed
+
+def check(program: str, limits: dict, engines: Dict[str, dict] = ENGINES) -> dict:
+    """Run program on every engine
+    
+    Returns {'times': {engine: seconds}, 'runaway': bool, 'divergent':
+    [engines]}. A program the reference stops with a limit is a runaway:
+    the others count steps differently, so they are not compared.
+    """
+    names = list(engines)
+    expected, times = None, {}
+    divergent = []
+    for name in names:
+        state, _ = run_engine(program, engines[name], limits)
+        if expected is None:
+            expected = state
+            if state[0] is not None and not state[0].startswith("crash"):
+                return {'times': {}, 'runaway': True, 'divergent': []}
+        elif state != expected:
+            divergent.append(name)
+        # Timed on a second run, with the fragments the first one decoded
+        times[name] = run_engine(program, engines[name], limits)[1]
+    return {'times': times, 'runaway': False, 'divergent': divergent}
+
+def shrink(program: str, diverges: Callable[[str], bool]) -> str:
+    """Smallest program found by deleting chunks of program while diverges holds"""
+    chunk = max(1, len(program) // 2)
+    while True:
+        index, changed = 0, False
+        while index < len(program):
+            candidate = program[:index] + program[index + chunk:]
+            if diverges(candidate):
+                program, changed = candidate, True
+            else:
+                index += chunk
+        if chunk == 1 and not changed:
+            return program
+        if not changed:
+            chunk //= 2
+
+def fuzz(seed: int = 0, count: int = 1000, max_steps: int = 20000, log=None, out=None) -> dict:
+    """Check count generated programs; the divergences found, shrunk, and speed per engine"""
+    rng = random.Random(seed)
+    generator = ProgramGenerator(rng)
+    limits = {'max_steps': max_steps, 'max_stack_depth': 2000, 'max_string_length': 10000}
+    divergences = []
+    ratios = {name: [] for name in list(ENGINES)[1:]}
+    runaways = 0
+    for index in range(count):
+        program = generator.program()
+        result = check(program, limits)
+        if out is not None:
+            out.write(json.dumps({'seed': seed, 'index': index, 'program': program, **result}) + "\n")
+        if result['runaway']:
+            runaways += 1
+            continue
+        times = result['times']
+        reference = max(times['reference'], 1e-7)
+        for name in ratios:
+            ratios[name].append(times[name] / reference)
+        for name in result['divergent']:
+            engines = {'reference': ENGINES['reference'], name: ENGINES[name]}
+            minimal = shrink(program, lambda text: bool(check(text, limits, engines)['divergent']))
+            divergences.append({'program': program, 'engine': name, 'minimal': minimal})
+            if log is not None:
+                log.write(f"DIVERGENCE {name}: {minimal!r} (from {program!r})\n")
+    # Geometric mean of time relative to the reference per program
+    speed = {name: math.exp(sum(map(math.log, values)) / len(values)) if values else None
+             for name, values in ratios.items()}
+    return {'programs': count, 'runaways': runaways, 'divergences': divergences, 'relative_time': speed}
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Differential fuzzer for the calculator engines")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--max-steps', type=int, default=20000)
+    parser.add_argument('--out', help="JSONL file with each program's engine times and divergences")
+    args = parser.parse_args(argv)
+    
+    if args.out:
+        with open(args.out, 'w') as out:
+            summary = fuzz(args.seed, args.count, args.max_steps, sys.stdout, out)
+    else:
+        summary = fuzz(args.seed, args.count, args.max_steps, sys.stdout)
+    print(f"{summary['programs']} programs, {summary['runaways']} stopped by a limit, "
+          f"{len(summary['divergences'])} divergent")
+    for name, ratio in summary['relative_time'].items():
+        if ratio is not None:
+            print(f"  {name:<10} {ratio:.2f}x the reference time (geometric mean)")
+    return 1 if summary['divergences'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
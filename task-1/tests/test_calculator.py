@@ -6,7 +6,13 @@ LVA 185.208 Programming Languages - Task 1
 Tests based on specific examples from assignment document
 """
 
+import io
+import json
+import random
+import tempfile
+import threading
 import unittest
+from collections import OrderedDict
 import sys
 import os
 
@@ -14,7 +20,10 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from calculator import Calculator
+    from calculator import (Calculator, CommandStream, FragmentCache, FragmentCompiler, Text, decode,
+                            BufferedOutput, CaptureOutput, PreReadInput, run_pipe, run_batch,
+                            LimitExceeded, StepLimitExceeded, StackLimitExceeded,
+                            StringLimitExceeded, DeadlineExceeded, Profiler)
 except ImportError:
     print("Error: Cannot import calculator module.")
     print("Make sure calculator.py is in the parent directory.")
@@ -22,6 +31,14 @@ except ImportError:
     print(f"Looking for calculator.py in: {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}")
     sys.exit(1)
 
+from benchmarks import bench
+import fuzz_engines
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class TestAssignmentExamples(unittest.TestCase):
     """Test examples directly from the assignment document"""
     
@@ -292,6 +309,691 @@ class TestRegisterOperations(unittest.TestCase):
         result = self.calc.execute_and_get_stack("B@")
         self.assertEqual(result, ["hello"])
 
+class TestCommandStream(unittest.TestCase):
+    """Test the segmented command stream behind @ and \\"""
+    
+    def setUp(self):
+        self.calc = Calculator()
+        self.calc.command_stream = ""
+        self.calc.data_stack.clear()
+    
+    def execute_and_get_stack(self, commands):
+        self.calc.command_stream = commands
+        self.calc.run()
+        return self.calc.data_stack.copy()
+    
+    def test_front_and_back_insertion(self):
+        """@ runs before the rest of the stream, \\ after it"""
+        result = self.execute_and_get_stack("( 1)\\(2)@ 3")
+        self.assertEqual(result, [2, 3, 1])
+    
+    def test_stream_reads_back_as_string(self):
+        """command_stream reflects pending segments"""
+        stream = CommandStream("ab")
+        stream.next()
+        stream.push_front("xy")
+        stream.append("z")
+        self.assertEqual(str(stream), "xybz")
+        self.assertEqual(stream.next(), "x")
+    
+    def test_error_clears_stream(self):
+        """An error stops execution, including appended segments"""
+        result = self.execute_and_get_stack("(5)\\ +")
+        self.assertEqual(result, [])
+        self.assertEqual(self.calc.command_stream, "")
+    
+    def test_long_program(self):
+        """Long programs run with a cursor rather than slicing"""
+        result = self.execute_and_get_stack("1 1+$" * 20000 + "7")
+        self.assertEqual(result, [7])
+
+class TestDecodedEngine(unittest.TestCase):
+    """Test pre-decoded dispatch against the character-level engine"""
+    
+    def run_engine(self, engine, commands):
+        calc = Calculator(engine)
+        calc.command_stream = commands
+        calc.run()
+        return calc.data_stack.copy(), calc.operation_mode
+    
+    def assertSameAsReference(self, commands):
+        self.assertEqual(self.run_engine('decoded', commands),
+                         self.run_engine('reference', commands))
+    
+    def test_literals_fold(self):
+        """Number and string literals decode to single pushes"""
+        ops = decode("12 3.5(a(b)c)")
+        self.assertEqual([arg for _, arg, _ in ops], [12, 3.5, "a(b)c"])
+        self.assertEqual([end for _, _, end in ops], [2, 6, 13])
+    
+    def test_literal_across_segments(self):
+        """Construction modes carry over segment boundaries"""
+        for commands in ["(12)@3", "(1.)@5", "(1)\\(2)@3", "((a)@b"]:
+            self.assertSameAsReference(commands)
+        self.assertEqual(self.run_engine('decoded', "(12)@3")[0], [123])
+    
+    def test_resume_after_apply(self):
+        """Execution resumes inside a segment after @ returns"""
+        calc = Calculator()
+        calc.registers['A'] = "1+"
+        calc.command_stream = "0" + " A@" * 100
+        calc.run()
+        self.assertEqual(calc.data_stack, [100])
+    
+    def test_decimal_from_literal_text(self):
+        """Decimals are parsed from their digits, not summed digit by digit"""
+        for engine in Calculator.ENGINES:
+            calc = Calculator(engine)
+            calc.command_stream = "0.3 12.34 (1.2)@5"
+            calc.run()
+            self.assertEqual(calc.data_stack, [0.3, 12.34, 1.25])
+    
+    def test_decimal_too_large_for_float(self):
+        """A decimal whose integer part overflows a float fails at the '.'"""
+        for commands in ["1" * 400 + ".5", "(1)@" + "1" * 400 + ".5 2"]:
+            states = []
+            for engine in Calculator.ENGINES:
+                calc = Calculator(engine, output=CaptureOutput())
+                calc.command_stream = commands
+                calc.run()
+                states.append((calc.data_stack, calc.operation_mode, calc.output.getvalue()))
+            self.assertEqual(states[0], states[1])
+            self.assertEqual(states[0][:2], ([], -1))
+            self.assertIn("int too large to convert to float", states[0][2])
+    
+    def test_long_literals_across_segments(self):
+        """Open literals are scanned in bulk in the following segment"""
+        for commands in ["((" + "x" * 5000 + ")@" + "y" * 5000 + ")",
+                         "(1)@" + "7" * 500 + " 1+", "(3.)@" + "1" * 40 + ".5",
+                         "(((a)@b)@c)d"]:
+            self.assertSameAsReference(commands)
+    
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Calculator('jit')
+
+class TestSuperinstructions(unittest.TestCase):
+    """Test fused idioms against the character-level engine"""
+    
+    def run_engine(self, engine, commands):
+        calc = Calculator(engine, output=CaptureOutput())
+        calc.command_stream = commands
+        calc.run()
+        return calc.data_stack.copy(), calc.output.getvalue(), calc.command_stream
+    
+    def assertSameAsReference(self, commands):
+        self.assertEqual(self.run_engine('decoded', commands),
+                         self.run_engine('reference', commands))
+    
+    def test_idioms_fuse(self):
+        names = [command.__name__ for command, _, _ in decode("2!+ 3! 1$ 1+ #1- 4!4$_1+$@ 4.0!")]
+        self.assertEqual(names, ['_copy_arithmetic', '_copy_literal', '_delete_literal',
+                                 '_literal_arithmetic', '_size_operation', '_conditional',
+                                 '_push_literal', '_copy'])
+    
+    def test_conditional(self):
+        for commands in ["1 0(8)(9~)4!4$_1+$@", "() 0(8)(9~)4!4$_1+$@", "0(8)(9~)(4!4$_1+$@)@",
+                         "(x)1(8)(9~) c@", "(abc)()2!=(1)(2)(4!4$_1+$@)@", "(8)(9)4!4$_1+$@"]:
+            self.assertSameAsReference(commands)
+    
+    def test_fallback_on_short_stack(self):
+        """Where the fast path does not apply the idiom's ops run one by one"""
+        for commands in ["1+", "1+ 2", "2!+ 3", "5 9!* 4", "(a) 1!+", "#1- 0$ 3$ 1!", "4!4$_1+$@ 5",
+                         "4!4$_1+$@", "(4!4$_1+$@)@", "c@"]:
+            self.assertSameAsReference(commands)
+    
+    def test_compiled_fragments_see_through_superinstructions(self):
+        calc = Calculator()
+        self.assertIsNotNone(calc.fragments.compile("2!+ 1$ #1- 3*"))
+
+class TestFragmentCompiler(unittest.TestCase):
+    """Test generated functions for straight-line fragments"""
+    
+    def run_engine(self, engine, commands, stack=()):
+        calc = Calculator(engine)
+        calc.registers['A'] = 4
+        calc.data_stack.extend(stack)
+        calc.command_stream = commands
+        calc.run()
+        return calc.data_stack.copy()
+    
+    def test_straight_line_detection(self):
+        for fragment in ["2!* 1+", "3$", "(a)(b)+ 1>", "A #~?_", "1.5 2.5*"]:
+            self.assertIsNotNone(FragmentCompiler().compile(decode(fragment)), fragment)
+        for fragment in ["1\"", "(x)@", "#$", "12", "", "(open"]:
+            self.assertIsNone(FragmentCompiler().compile(decode(fragment)), fragment)
+    
+    def test_apply_matches_reference(self):
+        """'@' on a compiled fragment has the same effect as interpreting it"""
+        for fragment, stack in [("2!* 1+", [3, 4]), ("3$ #", [1, 2, 3]), ("A 2/ 0/", []),
+                                ("1& (x)= ~", [5]), ("2!2!* 1+ 97% 3$", [1, 2])]:
+            # the applications after the first threshold ones run the generated function
+            commands = f"({fragment})@ " * (Calculator.fragments.threshold + 2)
+            self.assertEqual(self.run_engine('decoded', commands, stack),
+                             self.run_engine('reference', commands, stack), fragment)
+    
+    def test_shallow_stack_falls_back(self):
+        """Too few entries: the fragment is interpreted and reports the error"""
+        Calculator.fragments.compile("2!*")
+        self.assertEqual(self.run_engine('decoded', "(2!*)@ 7", [3]), [3])
+    
+    def test_exception_falls_back(self):
+        """A failing operation is interpreted, stopping where it fails"""
+        calc = Calculator()
+        calc.fragments.compile("1 2+ 1$?")
+        calc.data_stack.append(float('inf'))
+        calc.command_stream = "(1 2+ 1$?)@ 5"
+        calc.run()
+        self.assertEqual(calc.data_stack, [])
+        self.assertEqual(calc.command_stream, "")
+
+    def test_compiled_once_hot(self):
+        """Fragments are interpreted until applied threshold times"""
+        cache, counts = FragmentCache(threshold=3), OrderedDict()
+        self.assertIsNone(cache.function("2!* 1+", counts))
+        self.assertIsNone(cache.function("2!* 1+", counts))
+        self.assertIsNotNone(cache.function("2!* 1+", counts))
+        self.assertNotIn("7 1+", cache.functions)
+        calc = Calculator(output=CaptureOutput())
+        calc.fragments = cache
+        calc.command_stream = "(7 1+)@ " * 5
+        calc.run()
+        self.assertEqual(calc.data_stack, [8] * 5)
+        self.assertIn("7 1+", cache.functions)
+    
+    def test_hotness_is_per_calculator(self):
+        """Applications by one calculator do not make a fragment hot for another"""
+        cache = FragmentCache(threshold=3)
+        first, second = Calculator(output=CaptureOutput()), Calculator(output=CaptureOutput())
+        first.fragments = second.fragments = cache
+        first.command_stream = "(5 1+)@ " * 3
+        first.run()
+        self.assertEqual(first._applications["5 1+"], 3)
+        self.assertIsNone(cache.function("5 1+", second._applications))
+    
+    def test_shared_cache_across_threads(self):
+        """Calculators on several threads share one small cache"""
+        cache = FragmentCache(size=4, threshold=2)
+        def work(seed, results):
+            calc = Calculator(output=CaptureOutput())
+            calc.fragments = cache
+            for n in range(200):
+                calc.data_stack.clear()
+                calc.command_stream = f"{n} ({(seed + n) % 9} 1+ +)@ ({n % 5}*)@"
+                calc.run()
+                results.append(calc.data_stack == [(n + (seed + n) % 9 + 1) * (n % 5)])
+        results = []
+        threads = [threading.Thread(target=work, args=(seed, results)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 1600)
+
+class TestFragmentMemo(unittest.TestCase):
+    """Test memoized '@' of pure fragments"""
+    
+    def run_calc(self, commands, memo_size):
+        calc = Calculator(output=CaptureOutput(), memo_size=memo_size)
+        calc.registers['A'] = 5
+        calc.command_stream = commands
+        calc.run()
+        return calc
+    
+    def test_hits_on_identical_entries(self):
+        calc = self.run_calc("3 (1!1!*)@ 1$ (1!1!*)@ 4 (1!1!*)@", 16)
+        self.assertEqual(calc.data_stack, [3, 9, 4, 16])
+        self.assertEqual((calc.memo.hits, calc.memo.misses), (1, 2))
+    
+    def test_same_results_as_without_memo(self):
+        for commands in ["3 (2%)@ 3.0 (2%)@ 3 (2%)@ 3.0 (2%)@",
+                         "0.0~ (1!(a)+)@ 0.0 (1!(a)+)@ 0.0~ (1!(a)+)@",
+                         "(" + "x" * 100 + ") (1!1!+ 66*)@ 1$ (1!1!+ 66*)@ 2$ (1!1!+ 66*)@"]:
+            calc = self.run_calc(commands, 16)
+            self.assertEqual(calc.data_stack, self.run_calc(commands, 0).data_stack)
+            self.assertGreater(calc.memo.hits, 0)
+    
+    def test_impure_fragments_are_not_memoized(self):
+        """Register reads, '#' and anything not straight-line always run"""
+        calc = self.run_calc("(A 1+)@ (A 1+)@ (#)@ (#)@ (1\"2)@ (1\"2)@", 16)
+        self.assertEqual(calc.data_stack, [6, 6, 2, 3, 2, 2])
+        self.assertEqual((calc.memo.hits, calc.memo.misses), (0, 0))
+    
+    def test_lru_bound(self):
+        calc = self.run_calc("".join(f"{n} (1+)@ " for n in range(10)) + "0 (1+)@ 9 (1+)@", 4)
+        self.assertEqual(len(calc.memo.entries), 4)
+        self.assertEqual((calc.memo.hits, calc.memo.misses), (1, 11))
+    
+    def test_off_by_default(self):
+        self.assertIsNone(Calculator().memo)
+
+class TestLimits(unittest.TestCase):
+    """Test step, stack, string and time limits in both engines"""
+    
+    LOOP = "(1!\\)1!\\"  # runs forever with a constant stack
+    
+    def run_limited(self, commands, **limits):
+        exceptions = []
+        for engine in Calculator.ENGINES:
+            calc = Calculator(engine, output=CaptureOutput(), **limits)
+            calc.command_stream = commands
+            with self.assertRaises(LimitExceeded) as context:
+                calc.run()
+            exceptions.append(context.exception)
+        return exceptions
+    
+    def test_step_limit(self):
+        for e in self.run_limited(self.LOOP, max_steps=1000):
+            self.assertIsInstance(e, StepLimitExceeded)
+            self.assertEqual((e.limit, e.steps), (1000, 1000))
+            self.assertIn(e.data_stack, (["1!\\"], ["1!\\", "1!\\"]))
+            self.assertTrue(e.command_stream)
+    
+    def test_steps_within_limit(self):
+        calc = Calculator(output=CaptureOutput(), max_steps=3)
+        calc.command_stream = "1 2 3"
+        calc.run()
+        self.assertEqual(calc.data_stack, [1, 2, 3])
+    
+    def test_stack_limit(self):
+        for e in self.run_limited("(1!1!\\)1!\\", max_stack_depth=100):
+            self.assertIsInstance(e, StackLimitExceeded)
+            self.assertEqual(len(e.data_stack), 101)
+    
+    def test_string_limit(self):
+        """Doubling a string stops before the long string is built"""
+        for e in self.run_limited("(1!+2!@) (ab) 2!@", max_string_length=1000):
+            self.assertIsInstance(e, StringLimitExceeded)
+            self.assertEqual(e.data_stack, ["1!+2!@"])
+        calc = Calculator(output=CaptureOutput(), input=PreReadInput("x" * 20), max_string_length=10)
+        calc.command_stream = "'"
+        self.assertRaises(StringLimitExceeded, calc.run)
+    
+    def test_string_literal_limit(self):
+        """String literals count, closed, left open or applied as straight-line fragments"""
+        long = "x" * 20
+        for commands in [f"1 ({long})", f"1 ({long}", f"1 (({long})@", f"(({long}))@"]:
+            for e in self.run_limited(commands, max_string_length=10):
+                self.assertIsInstance(e, StringLimitExceeded, commands)
+        Calculator.fragments.compile(f"({long}) 1!")
+        calc = Calculator(output=CaptureOutput(), max_string_length=10)
+        calc.registers['A'] = f"({long}) 1!"
+        calc.command_stream = "A@"
+        self.assertRaises(StringLimitExceeded, calc.run)
+        calc = Calculator(output=CaptureOutput(), max_string_length=20)
+        calc.command_stream = f"({long}) ((ab)(cd))"
+        calc.run()
+        self.assertEqual(calc.data_stack, [long, "(ab)(cd)"])
+    
+    def test_time_limit(self):
+        for e in self.run_limited(self.LOOP, time_limit=0.05):
+            self.assertIsInstance(e, DeadlineExceeded)
+            self.assertGreater(e.steps, 0)
+    
+    def test_limits_apply_to_each_run(self):
+        calc = Calculator(output=CaptureOutput(), max_steps=5)
+        for _ in range(3):
+            calc.data_stack.clear()
+            calc.command_stream = "1 2+ 3+"
+            calc.run()
+        self.assertEqual(calc.data_stack, [6])
+
+class TestProfiler(unittest.TestCase):
+    """Test the opcode profile of Calculator(profile=True)"""
+    
+    LOOP = "(1-1!(2!@)()(4!4$_1+$@)@)100 2!@"  # counts down from 100 with tail calls
+    
+    def profile(self, commands):
+        calc = Calculator(output=CaptureOutput(), profile=True)
+        calc.command_stream = commands
+        calc.run()
+        return calc
+    
+    def test_same_results(self):
+        for commands in (self.LOOP, "3 (4 (5)@ +)@ *", "(1)\\ 2.5 3*"):
+            calc = Calculator(output=CaptureOutput())
+            calc.command_stream = commands
+            calc.run()
+            self.assertEqual(self.profile(commands).data_stack, calc.data_stack)
+    
+    def test_opcodes_and_fragments(self):
+        profiler = self.profile(self.LOOP).profiler
+        self.assertEqual(profiler.ops["1-"][0], 100)
+        self.assertEqual(profiler.ops["4!4$_1+$@"][0], 100)
+        self.assertEqual(profiler.fragments["1-1!(2!@)()(4!4$_1+$@)@"][0], 100)
+        self.assertEqual(profiler.fragments["2!@"][0], 99)
+        self.assertEqual(profiler.peak_depth, 6)
+        self.assertEqual(set(profiler.modes), {"execution"})
+    
+    def test_literal_modes(self):
+        """A literal left open by a fragment continues in its construction mode"""
+        profiler = self.profile("(1)@2 (1.)@5").profiler
+        self.assertEqual(set(profiler.modes), {"execution", "integer", "decimal"})
+    
+    def test_folded_stacks(self):
+        out = io.StringIO()
+        self.profile("3 (4 (5)@ +)@ *").profiler.write_folded(out)
+        paths = [line.rsplit(" ", 1)[0] for line in out.getvalue().splitlines()]
+        self.assertIn("3 (4 (5)@ +)@ *;4 (5)@ +;5;literal", paths)
+        self.assertIn("3 (4 (5)@ +)@ *;4 (5)@ +;+", paths)
+        self.assertIn("3 (4 (5)@ +)@ *;*", paths)
+    
+    def test_tail_calls_do_not_nest(self):
+        out = io.StringIO()
+        self.profile(self.LOOP).profiler.write_folded(out)
+        self.assertLessEqual(max(line.count(";") for line in out.getvalue().splitlines()), 2)
+    
+    def test_report(self):
+        report = self.profile(self.LOOP).profiler.report()
+        self.assertIn("4!4$_1+$@", report)
+        self.assertIn("Peak stack depth: 6", report)
+    
+    def test_decoded_engine_only(self):
+        self.assertIsNone(Calculator().profiler)
+        self.assertIsInstance(Calculator(profile=True).profiler, Profiler)
+        with self.assertRaises(ValueError):
+            Calculator('reference', profile=True)
+
+class TestBenchmarks(unittest.TestCase):
+    """Test the benchmark workloads compute what they claim and the comparison"""
+    
+    def run_program(self, program, lines):
+        calc = Calculator(output=CaptureOutput(), input=PreReadInput(lines))
+        calc.command_stream = program
+        calc.run()
+        self.assertEqual(calc.errors, [])
+        return calc
+    
+    def test_string_analysis(self):
+        program, lines = bench.string_analysis(300)
+        text = lines[0]
+        counts = [sum(c.isalpha() for c in text), sum(c.isdigit() for c in text), text.count(" "), len(text)]
+        self.assertEqual(self.run_program(program, lines).data_stack, counts)
+    
+    def test_string_search(self):
+        program, lines = bench.string_search(10000)
+        self.assertEqual(self.run_program(program, lines).data_stack, [lines[0].count("qz")])
+    
+    def test_loops(self):
+        self.assertEqual(self.run_program(*bench.countdown(50)).data_stack[0], 0)
+        calc = self.run_program(*bench.repl(4))
+        self.assertEqual(calc.output.getvalue(), "1\n9\n3\n21\n")
+        self.assertEqual(self.run_program(*bench.deep_stack(10)).data_stack, list(range(10)))
+    
+    def test_run_workload(self):
+        stats = bench.run_workload('countdown', repeat=2, warmup=0, size=10)
+        self.assertEqual(stats['repeat'], 2)
+        self.assertLessEqual(stats['min'], stats['median'])
+        self.assertGreater(stats['steps'], 0)
+    
+    def test_compare(self):
+        def baseline(**medians):
+            return {'workloads': {name: {'median': median, 'result': '[1]'} for name, median in medians.items()}}
+        rows = bench.compare(baseline(a=1.0, b=1.0, c=1.0, d=1.0), baseline(a=1.05, b=1.5, c=0.5, e=1.0))
+        self.assertEqual([(row['name'], row['status']) for row in rows],
+                         [('a', 'ok'), ('b', 'regression'), ('c', 'improvement'), ('d', 'missing'), ('e', 'new')])
+        current = baseline(a=1.0)
+        current['workloads']['a']['result'] = '[2]'
+        self.assertEqual(bench.compare(baseline(a=1.0), current)[0]['status'], 'changed')
+
+class TestEngineFuzzer(unittest.TestCase):
+    """Test the differential fuzzer and run a short campaign"""
+    
+    LIMITS = {'max_steps': 5000, 'max_stack_depth': 500, 'max_string_length': 2000}
+    
+    def test_engines_agree(self):
+        summary = fuzz_engines.fuzz(seed=0, count=150, max_steps=5000)
+        self.assertEqual(summary['divergences'], [])
+        self.assertEqual(set(summary['relative_time']), {'decoded', 'memo', 'profile'})
+    
+    def test_generator_is_reproducible(self):
+        programs = [[fuzz_engines.ProgramGenerator(random.Random(7)).program() for _ in range(5)]
+                    for _ in range(2)]
+        self.assertEqual(programs[0], programs[1])
+    
+    def test_check(self):
+        result = fuzz_engines.check("1 2+ (3)@ *", self.LIMITS)
+        self.assertFalse(result['runaway'])
+        self.assertEqual(result['divergent'], [])
+        self.assertEqual(set(result['times']), set(fuzz_engines.ENGINES))
+        self.assertTrue(fuzz_engines.check("(1!\\)1!\\", self.LIMITS)['runaway'])
+    
+    def test_shrink(self):
+        self.assertEqual(fuzz_engines.shrink("1 2 (3 4+) 5*", lambda text: "4+" in text), "4+")
+        self.assertEqual(fuzz_engines.shrink("(a)(b)", lambda text: text.count("(") == 2), "((")
+
+class TestText(unittest.TestCase):
+    """Test the Text representation of long strings"""
+    
+    def test_views_are_independent(self):
+        """Growing one view never changes another sharing its buffers"""
+        base = Text.of("abc")
+        left, right = base.append("d"), base.append("e")
+        front = base.prepend("x").prepend("y")
+        self.assertEqual((str(base), str(left), str(right)), ("abc", "abcd", "abce"))
+        self.assertEqual(str(front), "yxabc")
+        self.assertEqual(str(front.drop_first(3)), "bc")
+        self.assertEqual(str(front.drop_last(4)), "y")
+        self.assertEqual([front[i] for i in range(len(front))], list("yxabc"))
+    
+    def test_long_strings(self):
+        """Programs building long strings see plain str results"""
+        calc = Calculator()
+        calc.command_stream = "()" + " 65*" * 100 + " 1! 66* 2! 67* (x)4!+" + " 1 2!- 2$" * 98
+        calc.run()
+        self.assertEqual(calc.data_stack, ["A" * 100, "A" * 100 + "B", "A" * 100 + "C", "AAA"])
+        self.assertTrue(all(type(value) is str for value in calc.data_stack))
+    
+    def test_index_compare_and_apply(self):
+        calc = Calculator()
+        calc.command_stream = "(" + "1" * 70 + ")" + " 66* 1! 70% 2! 3! ="
+        calc.run()
+        self.assertEqual(calc.data_stack, ["1" * 70 + "B", 66, 1])
+        calc.data_stack.clear()
+        calc.command_stream = "(" + "1" * 70 + ")( 1+)+@"
+        calc.run()
+        self.assertEqual(calc.data_stack, [int("1" * 70) + 1])
+
+class TestChannels(unittest.TestCase):
+    """Test pluggable input and output"""
+    
+    def test_capture(self):
+        output = CaptureOutput()
+        calc = Calculator(output=output)
+        calc.command_stream = '(a)" 12" 2.5" 3.0" +'
+        calc.run()
+        self.assertEqual(output.getvalue(), "a122.53Error: Not enough operands for arithmetic operation\n")
+        self.assertEqual(output.getbytes()[:4], b"a122")
+    
+    def test_pre_read_input(self):
+        calc = Calculator(input=PreReadInput("12\n3.5\n word \n"))
+        calc.command_stream = "''''"
+        calc.run()
+        self.assertEqual(calc.data_stack, [12, 3.5, "word", ""])
+    
+    def test_buffered_output(self):
+        """Output reaches the stream when the buffer fills, before reading and after run"""
+        stream = io.StringIO()
+        seen = []
+        
+        class Input:
+            def readline(self):
+                seen.append(stream.getvalue())
+                return "7"
+        
+        calc = Calculator(output=BufferedOutput(stream, size=4), input=Input())
+        calc.command_stream = '(ab)" (c)" \' (de)"'
+        calc.run()
+        self.assertEqual(seen, ["abc"])
+        self.assertEqual(stream.getvalue(), "abcde")
+
+class TestPipeMode(unittest.TestCase):
+    """Test --pipe: one program run per input line"""
+    
+    def pipe(self, program, text, err=None):
+        out = io.StringIO()
+        run_pipe(program, io.StringIO(text), out, err if err is not None else io.StringIO())
+        return out.getvalue()
+    
+    def test_one_line_per_record(self):
+        self.assertEqual(self.pipe("2* 1+", "1\n2.5\n 40 \n"), "3\n6\n81\n")
+    
+    def test_records_start_on_fresh_stack(self):
+        """Leftovers and errors from one record do not reach the next"""
+        self.assertEqual(self.pipe("1!1!", "4\n(x)\n"), "4\n(x)\n")
+        self.assertEqual(self.pipe("1$", "3\n"), "\n")
+    
+    def test_errors_go_to_errfile(self):
+        """A failing record still gives exactly one result line"""
+        err = io.StringIO()
+        self.assertEqual(self.pipe("+", "3\n4\n", err), "3\n4\n")
+        self.assertEqual(err.getvalue(), "Error: Not enough operands for arithmetic operation\n" * 2)
+    
+    def test_program_with_control_flow(self):
+        """Programs that are not straight-line are interpreted; what they write goes to errfile"""
+        program = "1!\" (:)\" (2*)@ 1+"
+        err = io.StringIO()
+        self.assertEqual(self.pipe(program, "5\n-3\n", err), "11\n-5\n")
+        self.assertEqual(err.getvalue(), "5:-3:")
+    
+    def test_multiline_results_are_escaped(self):
+        """A result with line breaks stays on its record's line"""
+        self.assertEqual(self.pipe("1$ (x\ny)", "1\n2\n"), "x\\ny\nx\\ny\n")
+        self.assertEqual(self.pipe("1$ (a\\b\rc)", "1\n"), "a\\\\b\\rc\n")
+
+class TestBatch(unittest.TestCase):
+    """Test --batch: many programs, one JSON result line each"""
+    
+    JOBS = [
+        {'id': 'sum', 'program': '1 2+'},
+        {'id': 'echo', 'program': "'1!\"3*", 'input': '7\n'},
+        {'id': 'underflow', 'program': '(a)"+'},
+        {'program': '5 (x)'},
+    ]
+    
+    def batch(self, jobs, batch=JOBS, limits=None):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.jsonl')
+            with open(path, 'w') as f:
+                f.writelines(json.dumps(job) + "\n" for job in batch)
+            out = io.StringIO()
+            run_batch(path, jobs, out, limits)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+    
+    def test_results(self):
+        results = self.batch(1)
+        self.assertEqual([r['id'] for r in results], ['sum', 'echo', 'underflow', 4])
+        self.assertEqual([r['stack'] for r in results], [[3], [21], [], [5, 'x']])
+        self.assertEqual(results[1]['output'], '7')
+        self.assertEqual(results[2]['output'], 'aError: Not enough operands for arithmetic operation\n')
+        self.assertEqual(results[2]['errors'], ['Not enough operands for arithmetic operation'])
+        self.assertEqual(results[0]['steps'], 2)
+        self.assertTrue(all(r['seconds'] >= 0 for r in results))
+    
+    def test_process_pool_matches_single_process(self):
+        def outcome(results):
+            return [{k: v for k, v in r.items() if k != 'seconds'} for r in results]
+        self.assertEqual(outcome(self.batch(2)), outcome(self.batch(1)))
+    
+    def test_unserializable_result(self):
+        """A result json cannot write is reported on its own line; later jobs still run"""
+        results = self.batch(1, [{'id': 'big', 'program': "2" + " 1!*" * 14}, {'id': 'next', 'program': '1'}])
+        self.assertIsNone(results[0]['stack'])
+        self.assertIn("not serializable", results[0]['errors'][-1])
+        self.assertEqual(results[1]['stack'], [1])
+    
+    def test_limits(self):
+        """Limits for all jobs, overridden per job, stop runaway programs"""
+        loop = "(1!\\)1!\\"
+        batch = [{'id': 'loop', 'program': loop}, {'id': 'own', 'program': loop, 'max_steps': 10},
+                 {'id': 'slow', 'program': loop, 'max_steps': None, 'time_limit': 0.05},
+                 {'id': 'sum', 'program': '1 2+'}]
+        results = self.batch(1, batch, {'max_steps': 1000})
+        self.assertEqual([r['steps'] for r in results[:2]], [1000, 10])
+        self.assertTrue(results[0]['stopped'].startswith("StepLimitExceeded"))
+        self.assertTrue(results[2]['stopped'].startswith("DeadlineExceeded"))
+        self.assertEqual((results[3]['stack'], results[3]['stopped']), ([3], None))
+    
+    def test_directory_of_programs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, program in [('b.calc', '2 3*'), ('a.calc', '(x)(y)+')]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(program)
+            out = io.StringIO()
+            run_batch(directory, 1, out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(r['id'], r['stack']) for r in results], [('a.calc', ['xy']), ('b.calc', [6])])
+    
+    def test_reset(self):
+        calc = Calculator(output=CaptureOutput())
+        calc.command_stream = "1 2 (A)+ 1+"
+        calc.registers['c'] = 'changed'
+        calc.run()
+        self.assertEqual(len(calc.errors), 0)
+        calc.command_stream = "+"
+        calc.data_stack.clear()
+        calc.run()
+        self.assertEqual(len(calc.errors), 1)
+        calc.reset()
+        self.assertEqual((calc.data_stack, calc.errors, calc.steps, calc.command_stream), ([], [], 0, ""))
+        self.assertEqual(calc.registers, Calculator().registers)
+
+@unittest.skipUnless(numpy, "NumPy is not installed")
+class TestVectorized(unittest.TestCase):
+    """Test evaluate_vectorized against the interpreter row by row"""
+    
+    def setUp(self):
+        self.calc = Calculator(output=CaptureOutput())
+    
+    def scalar(self, program, **registers):
+        results = []
+        for row in range(len(next(iter(registers.values())))):
+            self.calc.reset()
+            for name, values in registers.items():
+                self.calc.registers[name] = values[row].item()
+            self.calc.command_stream = program
+            self.calc.run()
+            results.append(self.calc.data_stack[-1])
+        return results
+    
+    def assertMatches(self, program, **registers):
+        result = self.calc.evaluate_vectorized(program, **registers)
+        expected = self.scalar(program, **registers)
+        self.assertEqual([None if isinstance(v, str) else v for v in expected], result.tolist())
+    
+    def test_arithmetic(self):
+        a, b = numpy.array([1, 2, -3, 0]), numpy.array([2.5, 0.0, 1.0, -4.0])
+        result = self.calc.evaluate_vectorized("A B+2*", A=a, B=b)
+        self.assertEqual(result.tolist(), [7.0, 4.0, -4.0, -8.0])
+        self.assertMatches("A B+2* A 3%-", A=a, B=b)
+        self.assertMatches("A 7* 2 /~", A=a)
+    
+    def test_empty_string_rule(self):
+        """Division by zero and '%' on floats mask the row"""
+        a, b = numpy.array([1, 2, 3]), numpy.array([2, 0, 1])
+        self.assertEqual(self.calc.evaluate_vectorized("A B/", A=a, B=b).tolist(), [0.5, None, 3.0])
+        self.assertEqual(self.calc.evaluate_vectorized("A B%", A=a, B=b).tolist(), [1, None, 0])
+        self.assertEqual(self.calc.evaluate_vectorized("A 2.0%", A=a).tolist(), [None] * 3)
+        self.assertMatches("A B/ 1- 0<", A=a, B=b)
+    
+    def test_strings_from_empty_rows(self):
+        """Rows where "" meets '+' or '*' are left to the interpreter"""
+        a, b = numpy.array([1, 2, 3]), numpy.array([2, 0, 1])
+        self.assertMatches("A B/ 1+", A=a, B=b)
+        self.assertMatches("A B/ 65* 1%", A=a, B=b)
+        self.assertMatches("A B% 1! / A+", A=a, B=b)
+    
+    def test_comparisons_and_shuffles(self):
+        a, b = numpy.array([1.0, 2.0, 0.3]), numpy.array([1.0 + 1e-12, 1.0, 0.1 + 0.2])
+        self.assertEqual(self.calc.evaluate_vectorized("A B=", A=a, B=b).tolist(), [1, 0, 1])
+        self.assertMatches("A B 2! 2! < 3$ 0/ B>", A=a, B=b)
+    
+    def test_unsupported_programs(self):
+        a = numpy.array([1, 2])
+        for program in ["A(x)+", "A\"", "A 1!@", "A B+", "A A!", "+"]:
+            with self.assertRaises(ValueError):
+                self.calc.evaluate_vectorized(program, A=a)
+
 def run_assignment_verification():
     """Run verification tests based on assignment examples"""
     print("=" * 60)
@@ -0,0 +1,121 @@
+import hashlib
+import marshal
+import os
+import struct
+from ast_nodes import Integer, Variable, Lambda, Application, Record, Cond, Access
+from lexer import tokenize
+from parser import Parser
+
+# opcodes; an instruction is a tuple (opcode, operands...)
+(CONST, LOAD, LAMBDA, ARG, ARG_CONST, ARG_LOAD, CALL, TAIL_CALL,
+ BRANCH, JUMP, RECORD, BIND, END_RECORD, LAZY_RECORD, ACCESS, RETURN) = range(16)
+
+# bump whenever the instruction set or the compilation scheme changes
+BYTECODE_VERSION = 1
+MAGIC = b'FUNC'
+CACHE_DIR = '__funccache__'
+
+def compile_program(node):
+    """Compile an AST into a code block: a tuple of instructions ending with RETURN.
+
+    Blocks nest: lambda bodies, record fields and application arguments
+    are separate blocks, since the environment they run in is chosen at
+    run time. Everything is ints, strings and tuples, so code marshals.
+    """
+    out = []
+    emit(node, out, True)
+    out.append((RETURN,))
+    return tuple(out)
+
+def emit(node, out, tail):
+    cls = node.__class__
+    if cls is Integer:
+        out.append((CONST, node.value))
+    elif cls is Variable:
+        out.append((LOAD, node.name))
+    elif cls is Lambda:
+        out.append((LAMBDA, node.param, compile_program(node.body), type(node.body).__name__))
+    elif cls is Application:
+        emit(node.func, out, False)
+        # the argument runs in the caller's, the record's or the wrapper's environment
+        if node.arg.__class__ is Integer:
+            out.append((ARG_CONST, node.arg.value))
+        elif node.arg.__class__ is Variable:
+            out.append((ARG_LOAD, node.arg.name))
+        else:
+            out.append((ARG, compile_program(node.arg)))
+        out.append((TAIL_CALL,) if tail else (CALL,))
+    elif cls is Cond:
+        emit(node.cond, out, False)
+        branch = len(out)
+        out.append(None)
+        emit(node.then, out, tail)
+        if tail:
+            out.append((RETURN,))
+        else:
+            jump = len(out)
+            out.append(None)
+        out[branch] = (BRANCH, len(out))
+        emit(node.else_, out, tail)
+        if not tail:
+            out[jump] = (JUMP, len(out))
+    elif cls is Record:
+        if node.eager:
+            # fields run inline, each extending the environment of the next
+            out.append((RECORD,))
+            for name, expr in node.bindings:
+                emit(expr, out, False)
+                out.append((BIND, name))
+            out.append((END_RECORD,))
+        else:
+            exprs = dict(node.bindings)
+            out.append((LAZY_RECORD, tuple(exprs), tuple(compile_program(e) for e in exprs.values())))
+    elif cls is Access:
+        emit(node.record, out, False)
+        out.append((ACCESS, node.field))
+    else:
+        raise TypeError(f'Unknown node: {type(node)}')
+
+def compile_source(text):
+    return compile_program(Parser(tokenize(text)).parse())
+
+def cache_path(filename):
+    """__funccache__/<name>.funcc next to the source file"""
+    directory, base = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(base)[0] + '.funcc')
+
+def cache_header(source):
+    """Magic, bytecode and marshal versions, then the SHA-256 of the source bytes"""
+    return MAGIC + struct.pack('<HH', BYTECODE_VERSION, marshal.version) + hashlib.sha256(source).digest()
+
+def load_code(filename):
+    """Code for a source file, from its .funcc cache when the source is unchanged"""
+    with open(filename, 'rb') as f:
+        source = f.read()
+    header = cache_header(source)
+    path = cache_path(filename)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data.startswith(header):
+            return marshal.loads(data[len(header):])
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    code = compile_source(source.decode('utf-8'))
+    write_cache(path, header, code)
+    return code
+
+def write_cache(path, header, code):
+    # a missing cache only costs a recompile, so failures are ignored
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        data = header + marshal.dumps(code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,385 @@
+from ast_nodes import Integer, Variable, Lambda, Application, Record, Cond, Access
+from environment import Frame, FieldsFrame
+from values import FunctionValue, BuiltinValue, RecordValue, Thunk, EnvironmentWrapper, is_integer
+import builtins_lang as bl
+
+class Closure(FunctionValue):
+    """Function value carrying the compiled form of its body"""
+    __slots__ = ('code', 'names', 'chain')
+    def __init__(self, param, body, env, code, names, chain):
+        FunctionValue.__init__(self, param, body, env)
+        self.code = code
+        self.names = names    # frame layout for the parameter
+        self.chain = chain    # (names, code) of this and directly nested lambdas
+
+class CompiledThunk(Thunk):
+    """Thunk whose statement is a compiled closure rather than an AST"""
+    __slots__ = ()
+    def __init__(self, code, env):
+        Thunk.__init__(self, code, env, None)
+    def force(self):
+        if not self._done:
+            self.enter()
+            try:
+                self._value = self.stmt(self.env)
+            except BaseException:
+                self._value = None
+                raise
+            self._done = True
+        return self._value
+
+class TailCall:
+    """A closure call left for the caller to make, returned from tail position"""
+    __slots__ = ('code', 'frame')
+    def __init__(self, code, frame):
+        self.code = code; self.frame = frame
+
+def invoke(code, frame):
+    """Run a compiled function body, making the calls it returns until a value comes back"""
+    result = code(frame)
+    while result.__class__ is TailCall:
+        result = result.code(result.frame)
+    return result
+
+class Scope:
+    """Compile-time mirror of a Frame: the names it binds, in slot order.
+
+    A chain ending in the global scope is fully static. A chain ending in
+    None belongs to code whose surrounding environment is only known at
+    run time (arguments evaluated inside record environments).
+    """
+    def __init__(self, names, parent=None, lazy=False, static=None):
+        self.names = names
+        self.index = {name: slot for slot, name in enumerate(names)}
+        self.parent = parent
+        self.lazy = lazy      # slots hold thunks
+        self.static = parent.static if static is None and parent else bool(static)
+
+    def resolve(self, name):
+        depth, scope = 0, self
+        while scope is not None:
+            slot = scope.index.get(name)
+            if slot is not None:
+                return depth, slot, scope
+            depth += 1
+            scope = scope.parent
+        return None
+
+def fields_frame(rv):
+    """Frame binding the record's fields, shared by every access and application"""
+    if rv.fields_env is None:
+        if rv.eager:
+            rv.fields_env = FieldsFrame(tuple(rv.vals), list(rv.vals.values()), rv.env)
+        else:
+            frame = FieldsFrame(tuple(rv.exprs), [], rv.env)
+            frame.slots = [CompiledThunk(code, frame) for code in rv.exprs.values()]
+            rv.fields_env = frame
+    return rv.fields_env
+
+class Compiler:
+    """Compiles an AST once into nested Python closures taking a Frame.
+
+    A resolver pass runs alongside compilation: every variable bound by a
+    lambda or record becomes a (depth, slot) coordinate and global builtins
+    are captured directly. Results match Evaluator.eval.
+
+    Function bodies are compiled in tail position: a call there returns a
+    TailCall instead of making it, and the code that invoked the body makes
+    it in a loop, so tail calls run in constant Python stack.
+    """
+    def __init__(self):
+        builtins = bl.get_builtins()
+        self.global_env = Frame(tuple(builtins), list(builtins.values()))
+        self.global_scope = Scope(self.global_env.names, static=True)
+        self._compilers = {
+            Integer: self.compile_integer,
+            Variable: self.compile_variable,
+            Lambda: self.compile_lambda,
+            Cond: self.compile_cond,
+            Record: self.compile_record,
+            Access: self.compile_access,
+            Application: self.compile_application,
+        }
+
+    def eval(self, node, env=None):
+        if env is None or env is self.global_env:
+            return self.compile(node, self.global_scope)(self.global_env)
+        return self.compile(node, None)(env)
+
+    def compile(self, node, scope, tail=False):
+        compiler = self._compilers.get(type(node))
+        if compiler is None:
+            raise TypeError(f'Unknown node: {type(node)}')
+        if tail and node.__class__ in (Application, Cond):
+            return compiler(node, scope, tail)
+        return compiler(node, scope)
+
+    def deferred(self, node):
+        """Name-resolved version of node, compiled on first use"""
+        cell = []
+        def run(env):
+            if not cell:
+                cell.append(self.compile(node, None))
+            return cell[0](env)
+        return run
+
+    def compile_integer(self, node, scope):
+        value = node.value
+        return lambda env: value
+
+    def compile_variable(self, node, scope):
+        name = node.name
+        location = scope.resolve(name) if scope is not None else None
+        if location is None:
+            if scope is not None and scope.static:
+                def unbound(env):
+                    raise NameError(f'Unbound var: {name}')
+                return unbound
+            def dynamic(env):
+                val = env.lookup(name)
+                return val.force() if isinstance(val, Thunk) else val
+            return dynamic
+        depth, slot, owner = location
+        if owner is self.global_scope:
+            value = self.global_env.slots[slot]
+            return lambda env: value
+        if owner.lazy:
+            def lazy(env):
+                for _ in range(depth):
+                    env = env.parent
+                return env.slots[slot].force()
+            return lazy
+        if depth == 0:
+            return lambda env: env.slots[slot]
+        if depth == 1:
+            return lambda env: env.parent.slots[slot]
+        def variable(env):
+            for _ in range(depth):
+                env = env.parent
+            return env.slots[slot]
+        return variable
+
+    def compile_lambda(self, node, scope):
+        return self.closure_maker(node, self.lambda_chain(node, scope))
+
+    def lambda_chain(self, node, scope):
+        """(frame names, compiled body) for node and each lambda directly nested in its body"""
+        names = (node.param,)
+        inner = Scope(names, scope)
+        if isinstance(node.body, Lambda):
+            rest = self.lambda_chain(node.body, inner)
+            return ((names, self.closure_maker(node.body, rest)),) + rest
+        return ((names, self.compile(node.body, inner, tail=True)),)
+
+    def closure_maker(self, node, chain):
+        param, body, (names, code) = node.param, node.body, chain[0]
+        return lambda env: Closure(param, body, env, code, names, chain)
+
+    def compile_cond(self, node, scope, tail=False):
+        cond = self.compile(node.cond, scope)
+        then, else_ = (self.compile(n, scope, tail) for n in (node.then, node.else_))
+        def conditional(env):
+            cond_val = cond(env)
+            if cond_val.__class__ is int and cond_val == 0:
+                return else_(env)
+            return then(env)
+        return conditional
+
+    def compile_record(self, node, scope):
+        if node.eager:
+            fields = []
+            for name, expr in node.bindings:
+                fields.append((name, (name,), self.compile(expr, scope)))
+                scope = Scope((name,), scope)
+            def eager_record(env):
+                record_env = env
+                vals = {}
+                for name, names, code in fields:
+                    val = code(record_env)
+                    vals[name] = val
+                    record_env = Frame(names, [val], record_env)
+                return RecordValue(env, vals, {}, True)
+            return eager_record
+        exprs = dict(node.bindings)
+        record_scope = Scope(tuple(exprs), scope, lazy=True)
+        codes = [(name, self.compile(expr, record_scope)) for name, expr in exprs.items()]
+        def lazy_record(env):
+            return RecordValue(env, {}, dict(codes), False)
+        return lazy_record
+
+    def compile_access(self, node, scope):
+        record, field = self.compile(node.record, scope), node.field
+        def access(env):
+            rv = record(env)
+            if not isinstance(rv, RecordValue):
+                raise TypeError('Not a record')
+            if rv.eager:
+                if field not in rv.vals:
+                    raise NameError(f'Field {field} not found in record')
+                return rv.vals[field]
+            if field not in rv.exprs:
+                raise NameError(f'Field {field} not found in record')
+            frame = fields_frame(rv)
+            return frame.slots[frame.index[field]].force()
+        return access
+
+    def compile_application(self, node, scope, tail=False):
+        # Uncurry the spine: head applied to args, left to right
+        args = []
+        while isinstance(node, Application):
+            args.append(node.arg)
+            node = node.func
+        args.reverse()
+        codes = [self.compile(arg, scope) for arg in args]
+        builtin = self.global_builtin(node, scope)
+        if isinstance(node, Lambda):
+            # Direct redex: no function value is ever allocated
+            chain = self.lambda_chain(node, scope)
+            used = min(len(chain), len(codes))
+            code = self.compile_redex(chain, codes[:used], tail and used == len(codes))
+        elif builtin is not None and builtin.arity <= len(codes):
+            # Saturated builtin call: no partial applications
+            used = builtin.arity
+            code = self.compile_saturated(builtin, codes[:used])
+        else:
+            used = 0
+            code = self.compile(node, scope)
+        # records and wrapped functions evaluate the argument in their own environment
+        rest = []
+        for node, arg in zip(args[used:], codes[used:]):
+            dynamic_arg = arg if scope is None or isinstance(node, Integer) else self.deferred(node)
+            rest.append((arg, dynamic_arg))
+        if not rest:
+            return code
+        if len(rest) == 1:
+            return self.compile_call(code, *rest[0], tail)
+        return self.compile_spine(code, rest, tail)
+
+    def global_builtin(self, node, scope):
+        """The builtin a variable statically refers to, if any"""
+        if not isinstance(node, Variable) or scope is None:
+            return None
+        location = scope.resolve(node.name)
+        if location is None or location[2] is not self.global_scope:
+            return None
+        return self.global_env.slots[location[1]]
+
+    def compile_redex(self, chain, codes, tail=False):
+        body = chain[len(codes) - 1][1]
+        call = TailCall if tail else invoke
+        if len(codes) == 1:
+            names, arg = chain[0][0], codes[0]
+            return lambda env: call(body, Frame(names, [arg(env)], env))
+        layout = [(names, arg) for (names, _), arg in zip(chain, codes)]
+        def redex(env):
+            frame = env
+            for names, arg in layout:
+                frame = Frame(names, [arg(env)], frame)
+            return call(body, frame)
+        return redex
+
+    def compile_saturated(self, builtin, codes):
+        func = builtin.func
+        if len(codes) == 2:
+            first, second = codes
+            def binary(env):
+                x = first(env)
+                if x.__class__ is not int:
+                    raise TypeError('Built-in functions require integer args')
+                y = second(env)
+                if y.__class__ is not int:
+                    raise TypeError('Built-in functions require integer args')
+                return func(x, y)
+            return binary
+        def saturated(env):
+            vals = []
+            for code in codes:
+                val = code(env)
+                if val.__class__ is not int:
+                    raise TypeError('Built-in functions require integer args')
+                vals.append(val)
+            return func(*vals)
+        return saturated
+
+    def compile_call(self, func, arg, dynamic_arg, tail=False):
+        apply, apply_builtin = self.apply, self.apply_builtin
+        call = TailCall if tail else invoke
+        def application(env):
+            func_val = func(env)
+            cls = func_val.__class__
+            if cls is Closure:
+                return call(func_val.code, Frame(func_val.names, [arg(env)], func_val.env))
+            if cls is BuiltinValue:
+                arg_val = arg(env)
+                if arg_val.__class__ is int and len(func_val.args) + 1 == func_val.arity:
+                    return func_val.func(*func_val.args, arg_val)
+                return apply_builtin(func_val, arg_val)
+            return apply(func_val, dynamic_arg, tail)
+        return application
+
+    def compile_spine(self, func, rest, tail=False):
+        """Head of unknown kind applied to several arguments at once"""
+        count = len(rest)
+        codes = [arg for arg, _ in rest]
+        call, last = self.call, rest[-1]
+        body_call = TailCall if tail else invoke
+        def spine(env):
+            func_val = func(env)
+            cls = func_val.__class__
+            if cls is Closure:
+                chain = func_val.chain
+                if len(chain) >= count:
+                    frame = func_val.env
+                    for (names, _), arg in zip(chain, codes):
+                        frame = Frame(names, [arg(env)], frame)
+                    return body_call(chain[count - 1][1], frame)
+            elif cls is BuiltinValue and len(func_val.args) + count == func_val.arity:
+                vals = list(func_val.args)
+                for arg in codes:
+                    val = arg(env)
+                    if val.__class__ is not int:
+                        raise TypeError('Built-in functions require integer args')
+                    vals.append(val)
+                return func_val.func(*vals)
+            for arg, dynamic_arg in rest[:-1]:
+                func_val = call(func_val, arg, dynamic_arg, env)
+            return call(func_val, *last, env, tail)
+        return spine
+
+    def call(self, func_val, arg, dynamic_arg, env, tail=False):
+        """Apply func_val to a single argument"""
+        cls = func_val.__class__
+        if cls is Closure:
+            return (TailCall if tail else invoke)(func_val.code, Frame(func_val.names, [arg(env)], func_val.env))
+        if cls is BuiltinValue:
+            return self.apply_builtin(func_val, arg(env))
+        return self.apply(func_val, dynamic_arg, tail)
+
+    def apply(self, func_val, arg, tail=False):
+        # Record application - CREATES ENVIRONMENT WRAPPER
+        if isinstance(func_val, RecordValue):
+            new_env = fields_frame(func_val)
+            result = arg(new_env)
+            if isinstance(result, (BuiltinValue, FunctionValue)):
+                return EnvironmentWrapper(result, new_env)
+            return result
+        # Environment wrapper - argument is evaluated in the wrapped environment
+        if isinstance(func_val, EnvironmentWrapper):
+            actual_func, wrapper_env = func_val.value, func_val.env
+            if isinstance(actual_func, BuiltinValue):
+                result = self.apply_builtin(actual_func, arg(wrapper_env))
+                if isinstance(result, BuiltinValue):
+                    return EnvironmentWrapper(result, wrapper_env)
+                return result
+            if isinstance(actual_func, FunctionValue):
+                frame = Frame(actual_func.names, [arg(wrapper_env)], actual_func.env)
+                return TailCall(actual_func.code, frame) if tail else invoke(actual_func.code, frame)
+        raise TypeError(f'Cannot apply non-function: {type(func_val)}')
+
+    def apply_builtin(self, func_val, arg_val):
+        if not is_integer(arg_val):
+            raise TypeError('Built-in functions require integer args')
+        args = func_val.args + (arg_val,)
+        if len(args) < func_val.arity:
+            return BuiltinValue(func_val.name, func_val.func, func_val.arity, args)
+        return func_val.func(*args)
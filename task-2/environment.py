@@ -4,13 +4,59 @@ class Environment:
         self.parent = parent
 
     def lookup(self, name):
-        if name in self.bindings:
-            return self.bindings[name]
-        if self.parent:
-            return self.parent.lookup(name)
+        env = self
+        while env is not None:
+            if name in env.bindings:
+                return env.bindings[name]
+            env = env.parent
         raise NameError(f'Unbound var: {name}')
 
     def extend(self, name, val):
         new_env = Environment(parent=self)
         new_env.bindings[name] = val
         return new_env
+
+
+class Frame:
+    """Fixed-size frame whose bindings live in slots addressed by position.
+
+    `names` lists the bound names in slot order; compiled code reaches a
+    binding through a static (depth, slot) coordinate and only falls back
+    to `lookup` by name where the enclosing frames are not known statically.
+    """
+    __slots__ = ('names', 'slots', 'parent')
+
+    def __init__(self, names, slots, parent=None):
+        self.names = names
+        self.slots = slots
+        self.parent = parent
+
+    def lookup(self, name):
+        frame = self
+        while frame is not None:
+            names = frame.names
+            if name in names:
+                return frame.slots[names.index(name)]
+            frame = frame.parent
+        raise NameError(f'Unbound var: {name}')
+
+
+class FieldsFrame(Frame):
+    """Frame of a record's fields, which are reached by name at run time.
+
+    Field accesses are resolved against the record value only when they
+    run, so the frame keeps a name->slot index next to its slots.
+    """
+    __slots__ = ('index',)
+
+    def __init__(self, names, slots, parent=None):
+        Frame.__init__(self, names, slots, parent)
+        self.index = {name: slot for slot, name in enumerate(names)}
+
+    def lookup(self, name):
+        slot = self.index.get(name)
+        if slot is not None:
+            return self.slots[slot]
+        if self.parent is None:
+            raise NameError(f'Unbound var: {name}')
+        return self.parent.lookup(name)
@@ -1,12 +1,41 @@
-from lexer import Lexer
+from lexer import tokenize
 from parser import Parser
 from evaluator import Evaluator
+from compiler import Compiler
+from machine import Machine
+from vm import VM, VMClosure
+from values import FunctionValue, RecordValue, is_integer
+
+# evaluation engines selectable by name
+ENGINES = {
+    'tree': Evaluator,      # reference AST walker
+    'closure': Compiler,    # AST compiled once into Python closures
+    'cek': Machine,         # explicit continuation stack, unbounded depth
+    'vm': VM,               # bytecode stack machine (see bytecode.py)
+}
 
 class Interpreter:
-    def __init__(self):
-        self.ev = Evaluator()
+    def __init__(self, engine='tree'):
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown engine: {engine}')
+        self.engine = engine
+        self.ev = ENGINES[engine]()
 
     def eval_text(self, text: str):
-        parser = Parser(Lexer(text))
+        parser = Parser(tokenize(text))
         ast = parser.parse()
         return self.ev.eval(ast)
+
+def format_result(result):
+    """Display form of an evaluation result"""
+    if is_integer(result):
+        return str(result)
+    if isinstance(result, VMClosure):
+        return f"<function {result.param}.{result.kind}(...)>"
+    if isinstance(result, FunctionValue):
+        return f"<function {result.param}.{type(result.body).__name__}(...)>"
+    if isinstance(result, RecordValue):
+        record_type = "eager" if result.eager else "lazy"
+        field_count = len(result.vals) + len(result.exprs)
+        return f"<{record_type} record with {field_count} fields>"
+    return f"<{type(result).__name__}>"
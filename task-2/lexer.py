@@ -1,3 +1,5 @@
+import re
+
 class Token:
     INTEGER = 'INTEGER'; NAME = 'NAME'; DOT = 'DOT'
     LPAREN = 'LPAREN'; RPAREN = 'RPAREN'
@@ -10,7 +12,36 @@ class Token:
         self.type = type_; self.value = value
     def __repr__(self): return f'Token({self.type}, {self.value})'
 
+# Each match is (leading whitespace, token text); spans follow from the lengths
+TOKEN_RE = re.compile(r'(\s*)(\d+|[^\W\d_]+|\S)')
+PUNCTUATION = {
+    '.': Token.DOT, '(': Token.LPAREN, ')': Token.RPAREN,
+    '{': Token.LBRACE, '}': Token.RBRACE, '[': Token.LBRACKET, ']': Token.RBRACKET,
+    '=': Token.EQUAL, ',': Token.COMMA,
+}
+
+def tokenize(text, pos=0):
+    """Scan text in one pass into a list of (type, value, start, end) tuples ending with EOF"""
+    tokens = []
+    append, punctuation = tokens.append, PUNCTUATION.get
+    for space, tok in TOKEN_RE.findall(text, pos):
+        start = pos + len(space)
+        pos = start + len(tok)
+        kind = punctuation(tok)
+        if kind is not None:
+            append((kind, tok, start, pos))
+        elif tok.isalpha():
+            append((Token.NAME, tok, start, pos))
+        elif tok.isdecimal():
+            append((Token.INTEGER, int(tok), start, pos))
+        else:
+            bad = next(c for c in tok if not c.isalpha()) if tok[0].isalpha() else tok[0]
+            raise SyntaxError(f'Unknown char: {bad}')
+    append((Token.EOF, None, len(text), len(text)))
+    return tokens
+
 class Lexer:
+    """Character-at-a-time lexer, kept for callers that pull tokens one by one"""
     def __init__(self, text):
         self.text, self.pos = text, 0
         self.current = text[0] if text else None
@@ -54,4 +85,8 @@ class Lexer:
             if self.current == '=': self.advance(); return Token(Token.EQUAL, '=')
             if self.current == ',': self.advance(); return Token(Token.COMMA, ',')
             raise SyntaxError(f'Unknown char: {self.current}')
-        return Token(Token.EOF, None)
\ No newline at end of file
+        return Token(Token.EOF, None)
+
+    def tokenize(self):
+        """Remaining input as a token array"""
+        return tokenize(self.text, self.pos)
@@ -0,0 +1,165 @@
+from ast_nodes import Integer, Variable, Lambda, Application, Record, Cond, Access
+from evaluator import Evaluator
+from values import (FunctionValue, BuiltinValue, RecordValue, Thunk, EnvironmentWrapper, BLACKHOLE,
+                    CyclicThunkError, is_integer)
+
+# continuation frame kinds
+UPDATE, COND, EAGER, ACCESS, APPLY, CALL, BUILTIN, WRAP = range(8)
+
+class Machine(Evaluator):
+    """CEK-style evaluator running on an explicit continuation stack.
+
+    Control is either a node to evaluate (with its environment) or a value
+    being returned to the topmost continuation frame. Neither evaluation
+    nor thunk forcing uses the Python stack, so depth is bounded by memory.
+    Results match Evaluator.eval.
+    """
+
+    def eval(self, node, env=None):
+        if env is None:
+            env = self.global_env
+        stack = []
+        try:
+            return self.run(node, env, stack)
+        except BaseException:
+            # thunks left under evaluation can be forced again later
+            for frame in stack:
+                if frame[0] is UPDATE:
+                    frame[1]._value = None
+            raise
+
+    def run(self, node, env, stack):
+        value = None
+        while True:
+            # Evaluate node in env
+            if node is not None:
+                cls = node.__class__
+                if cls is Variable:
+                    value = env.lookup(node.name)
+                    if isinstance(value, Thunk):
+                        if not value._done:
+                            if value._value is BLACKHOLE:
+                                raise CyclicThunkError('Infinite loop: a value depends on itself')
+                            value._value = BLACKHOLE
+                            stack.append((UPDATE, value))
+                            node, env = value.stmt, value.env
+                            continue
+                        value = value._value
+                elif cls is Application:
+                    stack.append((APPLY, node.arg, env))
+                    node = node.func
+                    continue
+                elif cls is Integer:
+                    value = node.value
+                elif cls is Lambda:
+                    value = FunctionValue(node.param, node.body, env)
+                elif cls is Cond:
+                    stack.append((COND, node, env))
+                    node = node.cond
+                    continue
+                elif cls is Record:
+                    if node.eager and node.bindings:
+                        stack.append((EAGER, node, env, 0, {}, env))
+                        node = node.bindings[0][1]
+                        continue
+                    if node.eager:
+                        value = RecordValue(env, {}, {}, True)
+                    else:
+                        value = RecordValue(env, {}, {name: expr for name, expr in node.bindings}, False)
+                elif cls is Access:
+                    stack.append((ACCESS, node.field))
+                    node = node.record
+                    continue
+                else:
+                    raise TypeError(f'Unknown node: {type(node)}')
+                node = None
+
+            # Return value to the topmost continuation
+            if not stack:
+                return value
+            frame = stack.pop()
+            kind = frame[0]
+
+            if kind is UPDATE:
+                thunk = frame[1]
+                thunk._value = value
+                thunk._done = True
+
+            elif kind is APPLY:
+                arg, env = frame[1], frame[2]
+                if isinstance(value, RecordValue):
+                    env = self.fields_env(value)
+                    stack.append((WRAP, env))
+                elif isinstance(value, EnvironmentWrapper):
+                    actual_func, env = value.value, value.env
+                    if isinstance(actual_func, BuiltinValue):
+                        stack.append((BUILTIN, actual_func, env))
+                    elif isinstance(actual_func, FunctionValue):
+                        stack.append((CALL, actual_func))
+                    else:
+                        raise TypeError(f'Cannot apply non-function: {type(value)}')
+                elif isinstance(value, BuiltinValue):
+                    stack.append((BUILTIN, value, None))
+                elif isinstance(value, FunctionValue):
+                    stack.append((CALL, value))
+                else:
+                    raise TypeError(f'Cannot apply non-function: {type(value)}')
+                node = arg
+
+            elif kind is CALL:
+                func_val = frame[1]
+                node, env = func_val.body, func_val.env.extend(func_val.param, value)
+
+            elif kind is BUILTIN:
+                func_val, wrapper_env = frame[1], frame[2]
+                if not is_integer(value):
+                    raise TypeError('Built-in functions require integer args')
+                args = func_val.args + (value,)
+                if len(args) < func_val.arity:
+                    value = BuiltinValue(func_val.name, func_val.func, func_val.arity, args)
+                    if wrapper_env is not None:
+                        value = EnvironmentWrapper(value, wrapper_env)
+                else:
+                    value = func_val.func(*args)
+
+            elif kind is WRAP:
+                if isinstance(value, (BuiltinValue, FunctionValue)):
+                    value = EnvironmentWrapper(value, frame[1])
+
+            elif kind is COND:
+                cond_node, env = frame[1], frame[2]
+                is_true = not (is_integer(value) and value == 0)
+                node = cond_node.then if is_true else cond_node.else_
+
+            elif kind is EAGER:
+                _, record, outer_env, index, vals, record_env = frame
+                name = record.bindings[index][0]
+                vals[name] = value
+                record_env = record_env.extend(name, value)
+                index += 1
+                if index < len(record.bindings):
+                    stack.append((EAGER, record, outer_env, index, vals, record_env))
+                    node, env = record.bindings[index][1], record_env
+                else:
+                    value = RecordValue(outer_env, vals, {}, True)
+
+            elif kind is ACCESS:
+                field = frame[1]
+                if not isinstance(value, RecordValue):
+                    raise TypeError('Not a record')
+                if value.eager:
+                    if field not in value.vals:
+                        raise NameError(f'Field {field} not found in record')
+                    value = value.vals[field]
+                else:
+                    if field not in value.exprs:
+                        raise NameError(f'Field {field} not found in record')
+                    thunk = self.fields_env(value).bindings[field]
+                    if thunk._done:
+                        value = thunk._value
+                    elif thunk._value is BLACKHOLE:
+                        raise CyclicThunkError('Infinite loop: a value depends on itself')
+                    else:
+                        thunk._value = BLACKHOLE
+                        stack.append((UPDATE, thunk))
+                        node, env = thunk.stmt, thunk.env
@@ -8,12 +8,14 @@ Usage:
     python main.py file.func           # Execute file
     python main.py -test               # Run tests
     python main.py -demo               # Run demonstrations
+    python main.py --serve             # JSON-RPC server on stdin/stdout
 """
 
 import sys
 import os
-from interpreter import Interpreter
-from values import IntegerValue, FunctionValue, RecordValue
+from interpreter import Interpreter, format_result
+from bytecode import load_code
+from vm import VM
 
 def run_interactive():
     """Run interactive interpreter"""
@@ -47,11 +49,8 @@ def run_interactive():
 def run_file(filename):
     """Execute a file"""
     try:
-        with open(filename, 'r') as f:
-            content = f.read()
-        
-        interpreter = Interpreter()
-        result = interpreter.eval_text(content)
+        # bytecode comes from __funccache__ unless the source changed
+        result = VM().run(load_code(filename))
         print_result(result)
         
     except FileNotFoundError:
@@ -138,16 +137,7 @@ Advanced:
 
 def print_result(result):
     """Pretty print evaluation results"""
-    if isinstance(result, IntegerValue):
-        print(result.value)
-    elif isinstance(result, FunctionValue):
-        print(f"<function {result.param}.{type(result.body).__name__}(...)>")
-    elif isinstance(result, RecordValue):
-        record_type = "eager" if result.eager else "lazy"
-        field_count = len(result.vals) + len(result.exprs)
-        print(f"<{record_type} record with {field_count} fields>")
-    else:
-        print(f"<{type(result).__name__}>")
+    print(format_result(result))
 
 def main():
     """Main entry point"""
@@ -160,13 +150,16 @@ def main():
             run_tests()
         elif arg == '-demo':
             run_demonstrations()
+        elif arg == '--serve':
+            from server import serve
+            serve()
         elif arg in ['-h', '--help']:
             print(__doc__)
         else:
             # Treat as filename
             run_file(arg)
     else:
-        print("Usage: python main.py [file.func | -test | -demo | -h]")
+        print("Usage: python main.py [file.func | -test | -demo | --serve | -h]")
         sys.exit(1)
 
 if __name__ == "__main__":
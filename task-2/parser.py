@@ -1,32 +1,36 @@
-from lexer import Lexer, Token
+from lexer import Lexer, Token, tokenize
 from ast_nodes import Integer, Variable, Lambda, Application, Record, Cond, Access
 
 class Parser:
-    def __init__(self, lexer):
-        self.lexer = lexer
-        self.cur = lexer.get_next_token()
-        self.peek = lexer.get_next_token()
+    """Recursive descent over a token array from tokenize() (a Lexer or source text also works)"""
+    def __init__(self, tokens):
+        if isinstance(tokens, Lexer):
+            tokens = tokens.tokenize()
+        elif isinstance(tokens, str):
+            tokens = tokenize(tokens)
+        self.tokens, self.pos = tokens, 0
+        self.cur = tokens[0]  # (type, value, start, end)
         self.in_paren = False  # track parentheses for lambda
 
     def eat(self, ttype):
-        if self.cur.type == ttype:
-            self.cur = self.peek
-            self.peek = self.lexer.get_next_token()
+        if self.cur[0] == ttype:
+            self.pos += 1
+            self.cur = self.tokens[self.pos]
         else:
-            raise SyntaxError(f'Expected {ttype}, got {self.cur.type}')
+            raise SyntaxError(f'Expected {ttype}, got {self.cur[0]}')
 
     def parse(self):
         return self.parse_expr()
 
     def parse_expr(self):
         # Lambda only inside parentheses
-        if self.in_paren and self.cur.type == Token.NAME and self.peek.type == Token.DOT:
-            param = self.cur.value
+        if self.in_paren and self.cur[0] == Token.NAME and self.tokens[self.pos + 1][0] == Token.DOT:
+            param = self.cur[1]
             self.eat(Token.NAME)
             self.eat(Token.DOT)
             return Lambda(param, self.parse_expr())
         # Conditional
-        if self.cur.type == Token.NAME and self.cur.value == 'cond':
+        if self.cur[0] == Token.NAME and self.cur[1] == 'cond':
             self.eat(Token.NAME)
             cond_node = self.parse_basic()
             then_node = self.parse_basic()
@@ -37,53 +41,53 @@ class Parser:
     def parse_apply(self):
         node = self.parse_basic()
         # Left-associative application
-        while self.cur.type in (Token.INTEGER, Token.NAME, Token.LPAREN, Token.LBRACE, Token.LBRACKET):
+        while self.cur[0] in (Token.INTEGER, Token.NAME, Token.LPAREN, Token.LBRACE, Token.LBRACKET):
             node = Application(node, self.parse_basic())
         return node
 
     def parse_basic(self):
         # Literals, variables, parentheses, records
-        if self.cur.type == Token.INTEGER:
-            value = self.cur.value
+        if self.cur[0] == Token.INTEGER:
+            value = self.cur[1]
             self.eat(Token.INTEGER)
             node = Integer(value)
-        elif self.cur.type == Token.NAME:
-            name = self.cur.value
+        elif self.cur[0] == Token.NAME:
+            name = self.cur[1]
             self.eat(Token.NAME)
             node = Variable(name)
-        elif self.cur.type == Token.LPAREN:
+        elif self.cur[0] == Token.LPAREN:
             self.eat(Token.LPAREN)
             prev = self.in_paren
             self.in_paren = True
             node = self.parse_expr()
             self.in_paren = prev
             self.eat(Token.RPAREN)
-        elif self.cur.type in (Token.LBRACE, Token.LBRACKET):
-            eager = (self.cur.type == Token.LBRACKET)
-            self.eat(self.cur.type)
+        elif self.cur[0] in (Token.LBRACE, Token.LBRACKET):
+            eager = (self.cur[0] == Token.LBRACKET)
+            self.eat(self.cur[0])
             bindings = []
             # parse bindings
-            while self.cur.type not in (Token.RBRACE if not eager else Token.RBRACKET):
-                field = self.cur.value
+            while self.cur[0] not in (Token.RBRACE if not eager else Token.RBRACKET):
+                field = self.cur[1]
                 self.eat(Token.NAME)
                 self.eat(Token.EQUAL)
                 expr = self.parse_expr()
                 bindings.append((field, expr))
-                if self.cur.type == Token.COMMA:
+                if self.cur[0] == Token.COMMA:
                     self.eat(Token.COMMA)
                 else:
                     break
             self.eat(Token.RBRACE if not eager else Token.RBRACKET)
             node = Record(bindings, eager)
         else:
-            raise SyntaxError(f'Unexpected token: {self.cur}')
+            raise SyntaxError(f'Unexpected token: Token({self.cur[0]}, {self.cur[1]})')
 
         # Field access postfix
-        while self.cur.type == Token.DOT:
+        while self.cur[0] == Token.DOT:
             self.eat(Token.DOT)
-            if self.cur.type != Token.NAME:
+            if self.cur[0] != Token.NAME:
                 raise SyntaxError("Expected field name after '.'")
-            field = self.cur.value
+            field = self.cur[1]
             self.eat(Token.NAME)
             node = Access(node, field)
 
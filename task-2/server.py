@@ -0,0 +1,189 @@
+"""
+Line-delimited JSON-RPC 2.0 server over stdio (python main.py --serve)
+
+One request object per input line, one response object per output line.
+
+Methods:
+    evaluate {"source": text} or {"path": file}  -> {"output": text[, "value": int]}
+    check    {"source": text} or {"path": file}  -> {"ok": bool[, "error": message]}
+    cancel   {"id": id of a pending or running request} -> {"cancelled": bool}
+
+Requests run one at a time on a worker thread, so a cancel can arrive
+while an evaluation is in progress; the cancelled request answers with
+error code -32800. Compiled programs are kept in an LRU keyed by source.
+"""
+
+import json
+import sys
+import threading
+import queue
+from collections import OrderedDict
+from bytecode import compile_source
+from interpreter import format_result
+from values import is_integer
+from vm import VM, EvaluationCancelled
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+EVALUATION_ERROR = -32000
+REQUEST_CANCELLED = -32800
+
+class InvalidParams(Exception):
+    pass
+
+def valid_id(request_id):
+    """True for the request ids accepted: strings, integers and null"""
+    return request_id is None or isinstance(request_id, (str, int))
+
+class ProgramCache:
+    """LRU of compiled programs keyed by their source text"""
+    def __init__(self, size=64):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, source):
+        code = self.entries.get(source)
+        if code is None:
+            code = compile_source(source)
+            self.entries[source] = code
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(source)
+        return code
+
+class Server:
+    def __init__(self, infile=None, outfile=None, cache_size=64):
+        self.infile = infile if infile is not None else sys.stdin
+        self.outfile = outfile if outfile is not None else sys.stdout
+        self.programs = ProgramCache(cache_size)
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()  # guards the fields below and the output
+        self.pending = set()          # ids queued but not started
+        self.cancelled = set()        # pending ids to answer as cancelled
+        self.current = None           # (id, threading.Event) of the running request
+
+    def serve(self):
+        worker = threading.Thread(target=self.work, daemon=True)
+        worker.start()
+        for line in self.infile:
+            if line.strip():
+                self.dispatch(line)
+        # end of input: finish what is queued, then stop
+        self.requests.put(None)
+        worker.join()
+
+    def dispatch(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self.reply(None, error=(PARSE_ERROR, 'Parse error'))
+        if not isinstance(request, dict) or not valid_id(request.get('id')):
+            return self.reply(None, error=(INVALID_REQUEST, 'Invalid request'))
+        if not isinstance(request.get('method'), str):
+            return self.reply(request.get('id'), error=(INVALID_REQUEST, 'Invalid request'))
+        if request['method'] == 'cancel':
+            # answered right away, never queued behind the request it cancels
+            params = request.get('params')
+            target = params.get('id') if isinstance(params, dict) else None
+            if not valid_id(target):
+                return self.reply(request['id'], error=(INVALID_PARAMS, 'id must be a string, an integer or null'))
+            return self.reply(request.get('id'), {'cancelled': self.cancel(target)})
+        with self.lock:
+            self.pending.add(request.get('id'))
+        self.requests.put(request)
+
+    def cancel(self, request_id):
+        with self.lock:
+            if request_id in self.pending:
+                self.cancelled.add(request_id)
+                return True
+            if self.current is not None and self.current[0] == request_id:
+                self.current[1].set()
+                return True
+        return False
+
+    def work(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            self.handle(request)
+
+    def handle(self, request):
+        request_id, method = request.get('id'), request['method']
+        event = threading.Event()
+        with self.lock:
+            self.pending.discard(request_id)
+            if request_id in self.cancelled:
+                self.cancelled.discard(request_id)
+                event.set()
+            self.current = (request_id, event)
+        result = error = None
+        try:
+            if event.is_set():
+                raise EvaluationCancelled('Evaluation cancelled')
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise InvalidParams('params must be an object')
+            if method == 'evaluate':
+                result = self.evaluate(params, event)
+            elif method == 'check':
+                result = self.check(params)
+            else:
+                error = (METHOD_NOT_FOUND, f'Method not found: {method}')
+        except EvaluationCancelled:
+            error = (REQUEST_CANCELLED, 'Request cancelled')
+        except InvalidParams as e:
+            error = (INVALID_PARAMS, str(e))
+        except FileNotFoundError:
+            error = (EVALUATION_ERROR, f"File '{params['path']}' not found")
+        except Exception as e:
+            error = (EVALUATION_ERROR, str(e))
+        finally:
+            with self.lock:
+                self.current = None
+        # notifications (no id) get no response
+        if 'id' in request:
+            self.reply(request_id, result, error)
+
+    def source(self, params):
+        if isinstance(params.get('source'), str):
+            return params['source']
+        if isinstance(params.get('path'), str):
+            with open(params['path'], 'r') as f:
+                return f.read()
+        raise InvalidParams('expected "source" or "path"')
+
+    def evaluate(self, params, event):
+        vm = VM()
+        vm.cancelled = event
+        value = vm.run(self.programs.get(self.source(params)))
+        result = {'output': format_result(value)}
+        if is_integer(value):
+            result['value'] = value
+        return result
+
+    def check(self, params):
+        try:
+            self.programs.get(self.source(params))
+        except SyntaxError as e:
+            return {'ok': False, 'error': str(e)}
+        return {'ok': True}
+
+    def reply(self, request_id, result=None, error=None):
+        response = {'jsonrpc': '2.0', 'id': request_id}
+        if error is not None:
+            response['error'] = {'code': error[0], 'message': error[1]}
+        else:
+            response['result'] = result
+        line = json.dumps(response) + '\n'
+        with self.lock:
+            self.outfile.write(line)
+            self.outfile.flush()
+
+def serve():
+    Server().serve()
@@ -8,7 +8,7 @@ This test suite is adjusted to match your actual implementation capabilities.
 
 import unittest
 from interpreter import Interpreter
-from values import IntegerValue, FunctionValue, RecordValue, BuiltinValue
+from values import FunctionValue, RecordValue, BuiltinValue
 
 class TestBasicEvaluation(unittest.TestCase):
     def setUp(self):
@@ -16,8 +16,7 @@ class TestBasicEvaluation(unittest.TestCase):
 
     def eval(self, text):
         """Helper to evaluate and extract integer values"""
-        res = self.i.eval_text(text)
-        return res.value if isinstance(res, IntegerValue) else res
+        return self.i.eval_text(text)
 
     def test_integer_literals(self):
         """Test integer literal evaluation"""
@@ -46,8 +45,7 @@ class TestFunctions(unittest.TestCase):
         self.i = Interpreter()
 
     def eval(self, text):
-        res = self.i.eval_text(text)
-        return res.value if isinstance(res, IntegerValue) else res
+        return self.i.eval_text(text)
 
     def test_identity_function(self):
         """Test simple identity function"""
@@ -77,8 +75,7 @@ class TestRecords(unittest.TestCase):
         self.i = Interpreter()
 
     def eval(self, text):
-        res = self.i.eval_text(text)
-        return res.value if isinstance(res, IntegerValue) else res
+        return self.i.eval_text(text)
 
     def test_record_creation(self):
         """Test record creation"""
@@ -116,8 +113,7 @@ class TestComplexPrograms(unittest.TestCase):
         self.i = Interpreter()
 
     def eval(self, text):
-        res = self.i.eval_text(text)
-        return res.value if isinstance(res, IntegerValue) else res
+        return self.i.eval_text(text)
 
     def test_nested_records(self):
         """Test nested record structures"""
@@ -155,11 +151,11 @@ def run_assignment_verification():
     
     # Integers
     result = i.eval_text('42')
-    print(f"   ✅ Integers: 42 → {result.value}")
+    print(f"   ✅ Integers: 42 → {result}")
     
     # Functions (Lambda abstractions)
     result = i.eval_text('(x.mult x x) 5')
-    print(f"   ✅ Functions: (x.mult x x) 5 → {result.value}")
+    print(f"   ✅ Functions: (x.mult x x) 5 → {result}")
     
     # Structured data (Records) - Test creation first
     result = i.eval_text('[a=10, b=20]')
@@ -168,13 +164,13 @@ def run_assignment_verification():
     # Test record environment
     try:
         result = i.eval_text('[a=10, b=20] plus a b')
-        print(f"   ✅ Record Environment: [a=10, b=20] plus a b → {result.value}")
+        print(f"   ✅ Record Environment: [a=10, b=20] plus a b → {result}")
     except Exception as e:
         print(f"   ❌ Record Environment: Error - {e}")
     
     # Named entities (Variables)
     result = i.eval_text('plus 3 4')
-    print(f"   ✅ Named Entities: plus 3 4 → {result.value}")
+    print(f"   ✅ Named Entities: plus 3 4 → {result}")
     
     # Predefined operations
     operations = [
@@ -187,8 +183,7 @@ def run_assignment_verification():
     print(f"\n2. Testing Predefined Operations:")
     for expr, expected in operations:
         try:
-            result = i.eval_text(expr)
-            actual = result.value if isinstance(result, IntegerValue) else result
+            actual = i.eval_text(expr)
             status = "✅" if actual == expected else "❌"
             print(f"   {status} {expr} → {actual}")
         except Exception as e:
@@ -199,20 +194,20 @@ def run_assignment_verification():
     # Lazy vs Eager records (test creation first)
     try:
         lazy_result = i.eval_text('{a=5, b=mult a 2} b')
-        print(f"   ✅ Lazy Records: {{a=5, b=mult a 2}} b → {lazy_result.value}")
+        print(f"   ✅ Lazy Records: {{a=5, b=mult a 2}} b → {lazy_result}")
     except Exception as e:
         print(f"   ❌ Lazy Records: Error - {e}")
     
     try:
         eager_result = i.eval_text('[a=5, b=mult a 2] b')
-        print(f"   ✅ Eager Records: [a=5, b=mult a 2] b → {eager_result.value}")
+        print(f"   ✅ Eager Records: [a=5, b=mult a 2] b → {eager_result}")
     except Exception as e:
         print(f"   ❌ Eager Records: Error - {e}")
     
     # Currying
     try:
         result = i.eval_text('(plus 5) 3')
-        print(f"   ✅ Currying: (plus 5) 3 → {result.value}")
+        print(f"   ✅ Currying: (plus 5) 3 → {result}")
     except Exception as e:
         print(f"   ❌ Currying: Error - {e}")
     
@@ -221,14 +216,14 @@ def run_assignment_verification():
     # Nested functions
     try:
         result = i.eval_text('(x.y.plus (mult x 2) y) 3 4')
-        print(f"   ✅ Nested Functions: (x.y.plus (mult x 2) y) 3 4 → {result.value}")
+        print(f"   ✅ Nested Functions: (x.y.plus (mult x 2) y) 3 4 → {result}")
     except Exception as e:
         print(f"   ❌ Nested Functions: Error - {e}")
     
     # Higher-order functions
     try:
         result = i.eval_text('(f.x.f (f x)) (y.plus y 1) 5')
-        print(f"   ✅ Higher-order: (f.x.f (f x)) (y.plus y 1) 5 → {result.value}")
+        print(f"   ✅ Higher-order: (f.x.f (f x)) (y.plus y 1) 5 → {result}")
     except Exception as e:
         print(f"   ❌ Higher-order: Error - {e}")
     
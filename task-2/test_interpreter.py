@@ -1,14 +1,22 @@
+import io
+import json
+import os
+import tempfile
 import unittest
 from interpreter import Interpreter
-from values import IntegerValue
+from values import CyclicThunkError
+from lexer import Lexer, tokenize
+from parser import Parser
+from bytecode import load_code, cache_path
+from vm import VM
+from server import Server
 
 class TestInterpreter(unittest.TestCase):
     def setUp(self):
         self.i = Interpreter()
 
     def eval(self, text):
-        res = self.i.eval_text(text)
-        return res.value if isinstance(res, IntegerValue) else res
+        return self.i.eval_text(text)
 
     def test_int(self): self.assertEqual(self.eval('42'), 42)
     def test_lambda(self): self.assertEqual(self.eval('(x.x) 5'), 5)
@@ -17,6 +25,106 @@ class TestInterpreter(unittest.TestCase):
     def test_access_eager(self): self.assertEqual(self.eval('[a=1] a'), 1)
     def test_access_lazy(self): self.assertEqual(self.eval('{a=1} a'), 1)
     def test_field_access(self): self.assertEqual(self.eval('[r={x=10}, y = r.x] y'), 10)
+    def test_record_env(self): self.assertEqual(self.eval('{x=5, y=mult x 2} plus x y'), 15)
+    def test_wrapper(self): self.assertEqual(self.eval('([a=3] plus a) 4'), 7)
+    def test_cond(self): self.assertEqual(self.eval('(x.cond x 1 2) 0'), 2)
+    def test_partial(self): self.assertEqual(self.eval('(f.f 3) (plus 4)'), 7)
+    def test_shadowing(self): self.assertEqual(self.eval('(x.(x.plus x 1) 5) 1'), 6)
+    def test_record_scope(self): self.assertEqual(self.eval('(f.f x) [x=4]'), 4)
+    def test_lazy_fields(self): self.assertEqual(self.eval('{a=plus b 1, b=2} a'), 3)
+    def test_tail_calls(self):
+        self.assertEqual(self.eval('{f = (n.cond n (f (minus n 1)) 7), r = f 20000} r'), 7)
+        self.assertEqual(self.eval('{f = (n.cond n ([g=f] g (minus n 1)) 7)} f 20000'), 7)
+    def test_lazy_shared(self): self.assertEqual(self.eval('[r={a=plus 1 2, b=mult a a}, x=r.b, y=r.a] plus x y'), 12)
+    def test_curried_calls(self):
+        self.assertEqual(self.eval('(f.f 1 2 3) (x.y.z.plus x (mult y z))'), 7)
+        self.assertEqual(self.eval('(f.f 1) (x.y.x) 2'), 1)
+    def test_cyclic_thunk(self):
+        # every engine reports a value that depends on itself the same way
+        with self.assertRaises(CyclicThunkError): self.eval('{a=b, b=a} a')
+        with self.assertRaises(CyclicThunkError): self.eval('{r={x=r.x}} r.x')
+        with self.assertRaises(CyclicThunkError): self.eval('{a=plus 1 a} a')
+    def test_over_application(self):
+        with self.assertRaises(TypeError): self.eval('plus 1 2 3')
+        with self.assertRaises(TypeError): self.eval('plus (x.x) 1')
+
+class TestClosureEngine(TestInterpreter):
+    def setUp(self):
+        self.i = Interpreter(engine='closure')
+
+    def test_accumulating_tail_calls(self):
+        self.assertEqual(self.eval('{f = (n. acc. cond n (f (minus n 1) (plus acc n)) acc)} f 20000 0'),
+                         200010000)
+
+class TestMachine(TestInterpreter):
+    def setUp(self):
+        self.i = Interpreter(engine='cek')
+
+    def test_deep_recursion(self):
+        self.assertEqual(self.eval('{f = (n.cond n (plus 1 (f (minus n 1))) 0), r = f 20000} r'), 20000)
+
+class TestVM(TestMachine):
+    def setUp(self):
+        self.i = Interpreter(engine='vm')
+
+class TestTokenize(unittest.TestCase):
+    def test_spans(self):
+        self.assertEqual(tokenize('plus 12\n x.y')[:-1], [('NAME', 'plus', 0, 4), ('INTEGER', 12, 5, 7),
+                         ('NAME', 'x', 9, 10), ('DOT', '.', 10, 11), ('NAME', 'y', 11, 12)])
+    def test_unknown_char(self):
+        with self.assertRaises(SyntaxError): tokenize('plus 1 $')
+    def test_parser_accepts_lexer(self):
+        self.assertEqual(type(Parser(Lexer('(x.x) 1')).parse()), type(Parser(tokenize('(x.x) 1')).parse()))
+
+class TestFuncCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'prog.func')
+    def tearDown(self): self.dir.cleanup()
+    def run_file(self, text=None):
+        if text is not None:
+            with open(self.path, 'w') as f: f.write(text)
+        return VM().run(load_code(self.path))
+    def test_cache_written_and_reused(self):
+        self.assertEqual(self.run_file('(x.mult x x) 5'), 25)
+        self.assertTrue(os.path.exists(cache_path(self.path)))
+        self.assertEqual(self.run_file(), 25)
+    def test_changed_source_recompiles(self):
+        self.run_file('(x.mult x x) 5')
+        self.assertEqual(self.run_file('(x.mult x x) 6'), 36)
+    def test_corrupt_cache_ignored(self):
+        self.run_file('plus 3 4')
+        with open(cache_path(self.path), 'wb') as f: f.write(b'garbage')
+        self.assertEqual(self.run_file(), 7)
+
+class TestServer(unittest.TestCase):
+    def serve(self, *requests):
+        lines = [json.dumps(dict(jsonrpc='2.0', id=n, method=m, params=p)) for n, (m, p) in enumerate(requests)]
+        out = io.StringIO()
+        Server(io.StringIO('\n'.join(lines) + '\n'), out).serve()
+        return {r['id']: r for r in map(json.loads, out.getvalue().splitlines())}
+    def test_evaluate_and_check(self):
+        r = self.serve(('evaluate', {'source': 'plus 3 4'}), ('check', {'source': 'plus ('}),
+                       ('evaluate', {'source': 'q'}), ('frobnicate', {}))
+        self.assertEqual(r[0]['result'], {'output': '7', 'value': 7})
+        self.assertFalse(r[1]['result']['ok'])
+        self.assertEqual(r[2]['error']['message'], 'Unbound var: q')
+        self.assertEqual(r[3]['error']['code'], -32601)
+    def test_cancel(self):
+        r = self.serve(('evaluate', {'source': '{f = x.f x} f 1'}), ('cancel', {'id': 0}))
+        self.assertTrue(r[1]['result']['cancelled'])
+        self.assertEqual(r[0]['error']['code'], -32800)
+    def test_invalid_ids(self):
+        """Unhashable ids are rejected and the server keeps answering"""
+        lines = ['{"jsonrpc": "2.0", "id": [1], "method": "evaluate", "params": {"source": "1"}}',
+                 '{"jsonrpc": "2.0", "id": 2, "method": "cancel", "params": {"id": {"a": 1}}}',
+                 '{"jsonrpc": "2.0", "id": 3, "method": "evaluate", "params": {"source": "plus 1 2"}}']
+        out = io.StringIO()
+        Server(io.StringIO('\n'.join(lines) + '\n'), out).serve()
+        r = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual((r[0]['id'], r[0]['error']['code']), (None, -32600))
+        self.assertEqual((r[1]['id'], r[1]['error']['code']), (2, -32602))
+        self.assertEqual((r[2]['id'], r[2]['result']['value']), (3, 3))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,36 +1,65 @@
-class Value: pass
+class Value:
+    """Base of every non-integer runtime value.
 
-class IntegerValue(Value):
-    def __init__(self, value): self.value = value
+    Language integers are plain Python ints and are never boxed; use
+    is_integer() to tell them apart from Value instances.
+    """
+    __slots__ = ()
+
+def is_integer(value):
+    """True for a language integer (a plain int), False for any Value"""
+    return value.__class__ is int
 
 class FunctionValue(Value):
+    __slots__ = ('param', 'body', 'env')
     def __init__(self, param, body, env):
         self.param = param; self.body = body; self.env = env
 
 class BuiltinValue(Value):
-    def __init__(self, name, func, arity, args=None):
-        self.name = name; self.func = func; self.arity = arity; self.args = args or []
+    __slots__ = ('name', 'func', 'arity', 'args')
+    def __init__(self, name, func, arity, args=()):
+        self.name = name; self.func = func; self.arity = arity; self.args = args   # tuple of ints
 
 class RecordValue(Value):
+    __slots__ = ('env', 'eager', 'vals', 'exprs', 'fields_env')
     def __init__(self, parent_env, vals, exprs, eager):
         self.env = parent_env
         self.eager = eager
         self.vals = vals       # dict of name->Value (eager)
         self.exprs = exprs     # dict of name->AST (lazy)
+        self.fields_env = None # shared environment of the fields, built on first use
+
+class CyclicThunkError(RecursionError):
+    """A thunk was forced again while its own value was being computed"""
+
+# _value of a thunk whose evaluation is in progress
+BLACKHOLE = object()
 
 class Thunk(Value):
+    __slots__ = ('stmt', 'env', 'evaluator', '_value', '_done')
     def __init__(self, stmt, env, evaluator):
         self.stmt = stmt; self.env = env; self.evaluator = evaluator
         self._value = None; self._done = False
     def force(self):
         if not self._done:
-            self._value = self.evaluator.eval(self.stmt, self.env)
+            self.enter()
+            try:
+                self._value = self.evaluator.eval(self.stmt, self.env)
+            except BaseException:
+                self._value = None
+                raise
             self._done = True
         return self._value
+    def enter(self):
+        """Mark the thunk as under evaluation, failing if it already is"""
+        if self._value is BLACKHOLE:
+            raise CyclicThunkError('Infinite loop: a value depends on itself')
+        self._value = BLACKHOLE
     
 
 class EnvironmentWrapper(Value):
     """Wraps a value with an environment context for record applications"""
+    __slots__ = ('value', 'env')
     def __init__(self, value, env):
         self.value = value
-        self.env = env
\ No newline at end of file
+        self.env = env
@@ -0,0 +1,196 @@
+from bytecode import (compile_program, CONST, LOAD, LAMBDA, ARG, ARG_CONST, ARG_LOAD, CALL, TAIL_CALL,
+                      BRANCH, JUMP, RECORD, BIND, END_RECORD, LAZY_RECORD, ACCESS, RETURN)
+from evaluator import Evaluator
+from values import (FunctionValue, BuiltinValue, RecordValue, Thunk, EnvironmentWrapper, BLACKHOLE,
+                    CyclicThunkError)
+
+class EvaluationCancelled(Exception):
+    """Raised inside VM.run once its cancellation event is set"""
+
+class VMClosure(FunctionValue):
+    """Function value whose body is a code block"""
+    __slots__ = ('kind',)
+    def __init__(self, param, code, env, kind):
+        FunctionValue.__init__(self, param, code, env)
+        self.kind = kind      # node type of the body, for display
+
+class VM(Evaluator):
+    """Stack machine executing code blocks from bytecode.py.
+
+    Values live on one operand stack; calls, argument blocks and thunk
+    forcing push (code, pc, env) frames on a separate control stack, so
+    neither recursion nor thunk chains use the Python stack. Results
+    match Evaluator.eval.
+    """
+    cancelled = None   # optional threading.Event, polled at calls and thunk entry
+
+    def eval(self, node, env=None):
+        # thunks hand back the code block they were created with
+        code = node if isinstance(node, tuple) else compile_program(node)
+        return self.run(code, env)
+
+    def run(self, code, env=None):
+        if env is None:
+            env = self.global_env
+        control = []   # (code, pc, env) to resume; (None, thunk, None) to update
+        try:
+            return self.execute(code, env, control)
+        except BaseException:
+            # thunks left under evaluation can be forced again later
+            for frame in control:
+                if frame[0] is None:
+                    frame[1]._value = None
+            raise
+
+    def execute(self, code, env, control):
+        cancelled = self.cancelled
+        stack = []
+        pc = 0
+        while True:
+            instr = code[pc]
+            pc += 1
+            op = instr[0]
+
+            if op == LOAD or op == ARG_LOAD:
+                if op == ARG_LOAD:
+                    arg_env = self.arg_env(stack[-1], env)
+                    value = arg_env.lookup(instr[1])
+                else:
+                    value = env.lookup(instr[1])
+                if value.__class__ is Thunk:
+                    if not value._done:
+                        if value._value is BLACKHOLE:
+                            raise CyclicThunkError('Infinite loop: a value depends on itself')
+                        if cancelled is not None and cancelled.is_set():
+                            raise EvaluationCancelled('Evaluation cancelled')
+                        value._value = BLACKHOLE
+                        control.append((code, pc, env))
+                        control.append((None, value, None))
+                        code, pc, env = value.stmt, 0, value.env
+                        continue
+                    value = value._value
+                stack.append(value)
+
+            elif op == CALL or op == TAIL_CALL:
+                arg = stack.pop()
+                func = stack.pop()
+                cls = func.__class__
+                if cls is BuiltinValue:
+                    stack.append(self.apply_builtin(func, arg))
+                    continue
+                if cls is RecordValue:
+                    # Record application - CREATES ENVIRONMENT WRAPPER
+                    if isinstance(arg, (BuiltinValue, FunctionValue)):
+                        arg = EnvironmentWrapper(arg, self.fields_env(func))
+                    stack.append(arg)
+                    continue
+                if cls is EnvironmentWrapper:
+                    wrapper_env, func = func.env, func.value
+                    if isinstance(func, BuiltinValue):
+                        result = self.apply_builtin(func, arg)
+                        if isinstance(result, BuiltinValue):
+                            result = EnvironmentWrapper(result, wrapper_env)
+                        stack.append(result)
+                        continue
+                if cancelled is not None and cancelled.is_set():
+                    raise EvaluationCancelled('Evaluation cancelled')
+                if op == CALL:
+                    control.append((code, pc, env))
+                code, pc, env = func.body, 0, func.env.extend(func.param, arg)
+
+            elif op == CONST:
+                stack.append(instr[1])
+
+            elif op == ARG_CONST:
+                self.arg_env(stack[-1], env)
+                stack.append(instr[1])
+
+            elif op == ARG:
+                arg_env = self.arg_env(stack[-1], env)
+                control.append((code, pc, env))
+                code, pc, env = instr[1], 0, arg_env
+
+            elif op == RETURN:
+                while True:
+                    if not control:
+                        return stack.pop()
+                    code, pc, env = control.pop()
+                    if code is not None:
+                        break
+                    pc._value = stack[-1]
+                    pc._done = True
+
+            elif op == BRANCH:
+                value = stack.pop()
+                if value.__class__ is int and value == 0:
+                    pc = instr[1]
+
+            elif op == JUMP:
+                pc = instr[1]
+
+            elif op == LAMBDA:
+                stack.append(VMClosure(instr[1], instr[2], env, instr[3]))
+
+            elif op == ACCESS:
+                rv, field = stack.pop(), instr[1]
+                if not isinstance(rv, RecordValue):
+                    raise TypeError('Not a record')
+                if rv.eager:
+                    if field not in rv.vals:
+                        raise NameError(f'Field {field} not found in record')
+                    stack.append(rv.vals[field])
+                    continue
+                if field not in rv.exprs:
+                    raise NameError(f'Field {field} not found in record')
+                thunk = self.fields_env(rv).bindings[field]
+                if thunk._done:
+                    stack.append(thunk._value)
+                    continue
+                if thunk._value is BLACKHOLE:
+                    raise CyclicThunkError('Infinite loop: a value depends on itself')
+                if cancelled is not None and cancelled.is_set():
+                    raise EvaluationCancelled('Evaluation cancelled')
+                thunk._value = BLACKHOLE
+                control.append((code, pc, env))
+                control.append((None, thunk, None))
+                code, pc, env = thunk.stmt, 0, thunk.env
+
+            elif op == RECORD:
+                # builder holds the outer environment and the fields so far
+                stack.append((env, {}))
+
+            elif op == BIND:
+                value = stack.pop()
+                stack[-1][1][instr[1]] = value
+                env = env.extend(instr[1], value)
+
+            elif op == END_RECORD:
+                env, vals = stack.pop()
+                stack.append(RecordValue(env, vals, {}, True))
+
+            elif op == LAZY_RECORD:
+                stack.append(RecordValue(env, {}, dict(zip(instr[1], instr[2])), False))
+
+            else:
+                raise TypeError(f'Unknown opcode: {op}')
+
+    def arg_env(self, func, env):
+        """Environment the argument of an application of func is evaluated in"""
+        cls = func.__class__
+        if cls is VMClosure or cls is BuiltinValue:
+            return env
+        if cls is RecordValue:
+            return self.fields_env(func)
+        if cls is EnvironmentWrapper and isinstance(func.value, (BuiltinValue, FunctionValue)):
+            return func.env
+        if isinstance(func, (BuiltinValue, FunctionValue)):
+            return env
+        raise TypeError(f'Cannot apply non-function: {type(func)}')
+
+    def apply_builtin(self, func_val, arg_val):
+        if arg_val.__class__ is not int:
+            raise TypeError('Built-in functions require integer args')
+        args = func_val.args + (arg_val,)
+        if len(args) < func_val.arity:
+            return BuiltinValue(func_val.name, func_val.func, func_val.arity, args)
+        return func_val.func(*args)
@@ -5,6 +5,103 @@ open Types
 (** Path to Task 2 interpreter *)
 let interpreter_path = "../../task-2/main.py"
 
+(** Long-lived interpreter ([main.py --serve]), started on first run *)
+let server : (in_channel * out_channel) option ref = ref None
+let request_id = ref 0
+
+let stop_server () =
+  match !server with
+  | None -> ()
+  | Some channels ->
+      server := None;
+      (try ignore (Unix.close_process channels) with _ -> ())
+
+let () = at_exit stop_server
+
+let get_server () =
+  match !server with
+  | Some channels -> channels
+  | None ->
+      (* a dead server must not kill the editor on write *)
+      Sys.set_signal Sys.sigpipe Sys.Signal_ignore;
+      let cmd = Printf.sprintf "python3 %s --serve 2>/dev/null" interpreter_path in
+      let channels = Unix.open_process cmd in
+      server := Some channels;
+      channels
+
+(** Escape a string for use inside a JSON string literal *)
+let json_escape s =
+  let buf = Buffer.create (String.length s + 8) in
+  String.iter (fun c ->
+    match c with
+    | '"' -> Buffer.add_string buf "\\\""
+    | '\\' -> Buffer.add_string buf "\\\\"
+    | '\n' -> Buffer.add_string buf "\\n"
+    | c when Char.code c < 0x20 ->
+        Buffer.add_string buf (Printf.sprintf "\\u%04x" (Char.code c))
+    | c -> Buffer.add_char buf c) s;
+  Buffer.contents buf
+
+(** Index of [sub] in [s], if any *)
+let find_sub s sub =
+  let n = String.length s and m = String.length sub in
+  let rec go i =
+    if i + m > n then None
+    else if String.sub s i m = sub then Some i
+    else go (i + 1)
+  in
+  go 0
+
+(** Decoded string value of ["key"] in a JSON response line *)
+let json_string_field line key =
+  match find_sub line (Printf.sprintf "\"%s\": \"" key) with
+  | None -> None
+  | Some i ->
+      let buf = Buffer.create 64 in
+      let n = String.length line in
+      let rec go j =
+        if j >= n then None
+        else match line.[j] with
+          | '"' -> Some (Buffer.contents buf)
+          | '\\' when j + 1 < n ->
+              (match line.[j + 1] with
+               | 'n' -> Buffer.add_char buf '\n'; go (j + 2)
+               | 't' -> Buffer.add_char buf '\t'; go (j + 2)
+               | 'r' -> Buffer.add_char buf '\r'; go (j + 2)
+               | 'b' -> Buffer.add_char buf '\b'; go (j + 2)
+               | 'f' -> Buffer.add_char buf '\012'; go (j + 2)
+               | 'u' when j + 5 < n ->
+                   let code = int_of_string ("0x" ^ String.sub line (j + 2) 4) in
+                   if Uchar.is_valid code then Buffer.add_utf_8_uchar buf (Uchar.of_int code)
+                   else Buffer.add_char buf '?';
+                   go (j + 6)
+               | c -> Buffer.add_char buf c; go (j + 2))
+          | c -> Buffer.add_char buf c; go (j + 1)
+      in
+      go (i + String.length key + 5)
+
+(** Evaluate a file on the server: [Ok output] or [Error message] *)
+let evaluate_file filename =
+  let send () =
+    let (ic, oc) = get_server () in
+    incr request_id;
+    Printf.fprintf oc
+      "{\"jsonrpc\": \"2.0\", \"id\": %d, \"method\": \"evaluate\", \"params\": {\"path\": \"%s\"}}\n"
+      !request_id (json_escape filename);
+    flush oc;
+    input_line ic
+  in
+  (* a server that exited since the last run is restarted once *)
+  let line =
+    try send () with Sys_error _ | End_of_file -> stop_server (); send ()
+  in
+  match json_string_field line "output" with
+  | Some output -> Ok output
+  | None ->
+      Error (match json_string_field line "message" with
+             | Some message -> message
+             | None -> line)
+
 (** Run the current file through the Task 2 interpreter *)
 let run_program state =
   match state.filename with
@@ -23,29 +120,12 @@ let run_program state =
       in
       
       if not saved_state.modified then
-        (* Execute the interpreter *)
-        let cmd = Printf.sprintf "python3 %s %s 2>&1" interpreter_path filename in
-        let output = 
+        (* Evaluate on the persistent interpreter server *)
+        let output =
           try
-            let ic = Unix.open_process_in cmd in
-            let rec read_all acc =
-              try
-                let line = input_line ic in
-                read_all (acc ^ line ^ "\n")
-              with End_of_file -> acc
-            in
-            let result = read_all "" in
-            let status = Unix.close_process_in ic in
-            match status with
-            | Unix.WEXITED 0 -> 
-                (* Success *)
-                Printf.sprintf "Output: %s" 
-                  (if String.length result > 0 then result else "(no output)")
-            | Unix.WEXITED code -> 
-                (* Error *)
-                Printf.sprintf "Error (exit code %d): %s" code result
-            | _ -> 
-                "Process terminated abnormally"
+            match evaluate_file filename with
+            | Ok result -> Printf.sprintf "Output: %s\n" result
+            | Error message -> Printf.sprintf "Output: Error: %s\n" message
           with
           | Unix.Unix_error (err, _, _) ->
               Printf.sprintf "System error: %s" (Unix.error_message err)
@@ -72,24 +152,14 @@ let run_with_output_window state =
       in
       
       if not saved_state.modified then
-        (* Run the interpreter and capture output first *)
-        let cmd = Printf.sprintf "python3 %s %s 2>&1" interpreter_path filename in
-        let output_lines = ref [] in
-        let exit_status = 
+        (* Run the program and capture output first *)
+        let output_lines, exit_status =
           try
-            let ic = Unix.open_process_in cmd in
-            let rec read_lines () =
-              try
-                let line = input_line ic in
-                output_lines := line :: !output_lines;
-                read_lines ()
-              with End_of_file -> ()
-            in
-            read_lines ();
-            Unix.close_process_in ic
-          with _ -> Unix.WEXITED 1
+            match evaluate_file filename with
+            | Ok result -> (String.split_on_char '\n' result, Unix.WEXITED 0)
+            | Error message -> (["Error: " ^ message], Unix.WEXITED 0)
+          with _ -> ([], Unix.WEXITED 1)
         in
-        let output_lines = List.rev !output_lines in
         
         (* Now display everything cleanly *)
         Terminal.clear_screen ();